@@ -0,0 +1,28 @@
+import sys
+import os
+import argparse
+
+if os.geteuid() != 0:
+    print("❌ This script must be run as root. Use: sudo python3 backfill.py")
+    sys.exit(1)
+
+from main import load_config, AUDIT_LOG_PATH
+from core import log
+from core.backfill import backfill, find_archives, CHUNK_SIZE
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyze rotated (and gzipped) audit logs.")
+    parser.add_argument("paths", nargs="*", help="Files to scan (default: audit.log.1 ... audit.log.N)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_SIZE // (1024 * 1024), help="Byte-range size per worker for plain files")
+    parser.add_argument("--include-live", action="store_true", help="Also scan the live audit.log")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = load_config()
+    log.configure(config.get("logging"))
+    paths = args.paths or find_archives(AUDIT_LOG_PATH)
+    if args.include_live:
+        paths.append(AUDIT_LOG_PATH)
+    backfill(config, paths, workers=args.workers, chunk_size=args.chunk_mb * 1024 * 1024)
@@ -0,0 +1,107 @@
+"""
+Stand-in for auditd's af_unix dispatcher plugin: listens on a unix stream
+socket and sends every client that connects the records of a recorded
+audit.log, one per line (the plugin's `string` format), as auditd would
+while logging them. Lets noctilogd's `audisp: {mode: socket}` ingestion be
+tried without auditd; for `mode: stdin`, pipe the file into noctilogd.
+
+    python3 benchmarks/audisp_replay.py LOG [-s SOCKET] [--rate LINES_PER_SEC] [--loop] [--once] [--close]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.audisp import SOCKET_PATH
+
+CHUNK_BYTES = 64 * 1024
+
+def read_records(path):
+    with open(path, "rb") as f:
+        return [line if line.endswith(b"\n") else line + b"\n" for line in f if line.strip()]
+
+def chunks(records, rate):
+    # As fast as the client reads without a rate; otherwise ~10 sends per second
+    if not rate:
+        chunk, size = [], 0
+        for record in records:
+            chunk.append(record)
+            size += len(record)
+            if size >= CHUNK_BYTES:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+        if chunk:
+            yield b"".join(chunk)
+        return
+
+    per_tick = max(int(rate / 10), 1)
+    start = time.monotonic()
+    for sent in range(0, len(records), per_tick):
+        delay = start + sent / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        yield b"".join(records[sent:sent + per_tick])
+
+def replay(conn, records, rate, loop, close):
+    # Like auditd, the connection stays open once the records are sent
+    # (until the client leaves) unless `close` asks to end the feed
+    sent = 0
+    try:
+        while True:
+            for chunk in chunks(records, rate):
+                conn.sendall(chunk)
+            sent += len(records)
+            if not loop:
+                break
+        if not close:
+            while conn.recv(4096):
+                pass
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        conn.close()
+    return sent
+
+def serve(socket_path, records, rate=0, loop=False, once=False, close=False):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    directory = os.path.dirname(socket_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    print(f"Replaying {len(records)} record(s) on {socket_path} to each client.")
+    try:
+        while True:
+            conn, _ = server.accept()
+            if once:
+                sent = replay(conn, records, rate, loop, close)
+                print(f"{sent} record(s) sent.")
+                return
+            threading.Thread(target=replay, args=(conn, records, rate, loop, close), daemon=True).start()
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log", help="recorded audit.log to replay")
+    parser.add_argument("-s", "--socket", default=SOCKET_PATH, help=f"socket path (default: {SOCKET_PATH})")
+    parser.add_argument("--rate", type=float, default=0, help="records per second (default: as fast as read)")
+    parser.add_argument("--loop", action="store_true", help="replay the log over and over")
+    parser.add_argument("--once", action="store_true", help="exit after serving the first client")
+    parser.add_argument("--close", action="store_true", help="close the connection after the replay (feed loss)")
+    args = parser.parse_args()
+
+    try:
+        serve(args.socket, read_records(args.log), args.rate, args.loop, args.once, args.close)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Throughput of core.auditd.parse_record against the per-field regex
+extraction the auditd detectors used before it (one re.search per field,
+with the pattern rebuilt from an f-string on every call), on a synthetic
+audit.log from generate_audit_log.py (or --log). Both extract the
+timestamp, uid, auid, pid and exe; parse_record_all also tokenizes every
+field of each record, which the detectors only do for EXECVE arguments.
+
+The log is processed in chunks, every extractor on the same chunk in turn,
+so drift in machine load hits all of them alike; a chunk's time is the
+best of --repeat passes. parse_record runs at about 1.2x the regex
+extraction per record, full tokenization at about 0.75x.
+
+    python3 benchmarks/bench_auditd_parser.py [-n LINES] [--log PATH] [--repeat N] [--json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.auditd import parse_record
+from generate_audit_log import generate
+
+FIELDS = ("uid", "auid", "pid", "exe")
+CHUNK_LINES = 100_000
+
+def regex_fields(line):
+    # The approach being replaced
+    ts = re.search(r"audit\((\d+\.\d+):\d+\)", line)
+    result = {"timestamp": float(ts.group(1)) if ts else None}
+    for key in FIELDS:
+        match = re.search(rf"{key}=([^\s]+)", line)
+        result[key] = match.group(1).strip('"') if match else "N/A"
+    return result
+
+def parser_fields(line):
+    record = parse_record(line)
+    result = {"timestamp": record.timestamp}
+    for key in FIELDS:
+        result[key] = record.get(key, "N/A")
+    return result
+
+def parser_all_fields(line):
+    # Every field tokenized, as for EXECVE argument lists
+    return parse_record(line).fields
+
+EXTRACTORS = [
+    ("regex_per_field", regex_fields),
+    ("parse_record", parser_fields),
+    ("parse_record_all", parser_all_fields),
+]
+
+def chunks(path, limit):
+    with open(path, "r", errors="replace") as f:
+        lines = f if limit is None else itertools.islice(f, limit)
+        while True:
+            chunk = list(itertools.islice(lines, CHUNK_LINES))
+            if not chunk:
+                return
+            yield chunk
+
+def best_of(extract, chunk, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in chunk:
+            extract(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(path, limit, repeat):
+    seconds = dict.fromkeys([name for name, _ in EXTRACTORS], 0.0)
+    count = 0
+    for chunk in chunks(path, limit):
+        count += len(chunk)
+        for name, extract in EXTRACTORS:
+            seconds[name] += best_of(extract, chunk, repeat)
+    return [
+        {"name": name, "lines": count, "seconds": round(elapsed, 3), "lines_per_sec": int(count / elapsed)}
+        for name, elapsed in seconds.items()
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--lines", type=int, default=2_000_000, help="lines to generate and parse (default: 2000000)")
+    parser.add_argument("--log", help="parse this audit.log instead of a generated one (up to -n lines)")
+    parser.add_argument("--repeat", type=int, default=3, help="passes per chunk, best one counts (default: 3)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.log:
+        results = run(args.log, args.lines, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory(prefix="noctilog-bench-") as scratch:
+            path = os.path.join(scratch, "audit.log")
+            generate(path, lines=args.lines)
+            results = run(path, args.lines, args.repeat)
+    baseline = results[0]["lines_per_sec"]
+    for result in results:
+        result["speedup"] = round(result["lines_per_sec"] / baseline, 2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(f"{result['name']:>16}: {result['lines']} lines in {result['seconds']}s "
+              f"({result['lines_per_sec']} lines/s, {result['speedup']}x)")
+
+if __name__ == "__main__":
+    main()
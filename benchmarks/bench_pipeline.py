@@ -0,0 +1,239 @@
+"""
+Per-stage timings of the one-shot analysis path on a synthetic audit.log
+(see generate_audit_log.py): read_sources, run_detectors,
+generate_event_hash, append_jsonl_events, jsonl_contains_hash,
+db.insert_event (one transaction per event, as the old store path did),
+db.EventWriter (batched), and a headless NoctilogDashboard.refresh_data,
+both idle and with new lines to analyze on every refresh.
+
+Everything runs in a scratch directory, so the real output/ is untouched.
+Results include the git revision and parameters and can be written as
+JSON with --output to compare releases. Must run as root, like main.py.
+
+    python3 benchmarks/bench_pipeline.py [-n LINES] [--mix MIX] [--refreshes N] [--json] [--output FILE]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import yaml
+import main
+from core import db
+from core.hash_utils import generate_event_hash
+from generate_audit_log import generate, DEFAULT_MIX
+
+# Cheap stages are repeated until they have run at least this long
+MIN_SECONDS = 0.5
+REFRESH_LINES = 2000
+
+def result(name, items, elapsed, unit):
+    return {
+        "name": name,
+        "items": items,
+        "unit": unit,
+        "seconds": round(elapsed, 4),
+        "per_sec": int(items / elapsed) if elapsed > 0 else None,
+        "usec_per_item": round(elapsed / items * 1e6, 2) if items else None,
+    }
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+def repeated(func, items):
+    # Repeats `func` (which handles `items` items) for at least MIN_SECONDS
+    passes = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        passes += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SECONDS or not items:
+            return passes * items, elapsed
+
+@contextlib.contextmanager
+def quiet():
+    # Log lines are echoed to stdout; keep them off the terminal. The
+    # redirect is done on the file descriptor because Textual replaces
+    # sys.stdout while the app runs.
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, 1)
+        with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+            yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_stages(config, log_path, lines):
+    results = []
+
+    main.AUDIT_LOG_PATH = log_path
+    main._sources = None
+    config = dict(config, log_tail_lines=lines + 1)
+    audit_lines = []
+
+    def read_all():
+        while True:
+            chunk = [line for _, new_lines, _ in main.read_sources(config) for line in new_lines]
+            if not chunk:
+                return
+            audit_lines.extend(chunk)
+
+    _, elapsed = timed(read_all)
+    results.append(result("read_sources", len(audit_lines), elapsed, "lines"))
+
+    events, elapsed = timed(lambda: main.run_detectors(config, audit_lines))
+    results.append(result("run_detectors", len(audit_lines), elapsed, "lines"))
+
+    items, elapsed = repeated(lambda: [generate_event_hash(event) for event in events], len(events))
+    results.append(result("generate_event_hash", items, elapsed, "events"))
+    for event in events:
+        event["event_hash"] = generate_event_hash(event)
+
+    jsonl_path = config["output"]["jsonl"]
+    with quiet():
+        _, elapsed = timed(lambda: main.append_jsonl_events(jsonl_path, events, config.get("segments")))
+    results.append(result("append_jsonl_events", len(events), elapsed, "events"))
+
+    # Half of the lookups hit, half miss
+    probes = [event["event_hash"] for event in events] + [event["event_hash"][::-1] for event in events]
+    items, elapsed = repeated(lambda: [main.jsonl_contains_hash(jsonl_path, h) for h in probes], len(probes))
+    results.append(result("jsonl_contains_hash", items, elapsed, "lookups"))
+
+    conn = db.init_db(config["output"]["db"])
+
+    def insert_each():
+        for event in events:
+            db.insert_event(conn, event)
+
+    with quiet():
+        _, elapsed = timed(insert_each)
+    results.append(result("db.insert_event", len(events), elapsed, "events"))
+
+    batch_conn = db.init_db(config["output"]["db"] + ".batch")
+    writer = db.EventWriter(batch_conn)
+
+    def insert_batched():
+        for event in events:
+            writer.add(event)
+        writer.flush()
+
+    with quiet():
+        _, elapsed = timed(insert_batched)
+    results.append(result("db.EventWriter", len(events), elapsed, "events"))
+    return results
+
+async def bench_dashboard(log_path, refreshes, seed):
+    from dashboard import NoctilogDashboard
+
+    results = []
+    app = NoctilogDashboard()
+    async with app.run_test() as pilot:
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+
+        async def refresh():
+            app.request_refresh()
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+
+        start = time.perf_counter()
+        for _ in range(refreshes):
+            await refresh()
+        results.append(result("dashboard.refresh_data (idle)", refreshes, time.perf_counter() - start, "refreshes"))
+
+        elapsed = 0.0
+        for n in range(refreshes):
+            generate(log_path, lines=REFRESH_LINES, seed=seed + n + 1, append=True)
+            start = time.perf_counter()
+            await refresh()
+            elapsed += time.perf_counter() - start
+        results.append(result(f"dashboard.refresh_data (+{REFRESH_LINES} lines)", refreshes, elapsed, "refreshes"))
+    return results
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--lines", type=int, default=100_000, help="audit lines to generate (default: 100000)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"event mix for the generator (default: {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=0, help="generator seed (default: 0)")
+    parser.add_argument("--refreshes", type=int, default=5, help="dashboard refreshes per variant (default: 5)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    with open(os.path.join(REPO_ROOT, "config.yaml"), "r") as f:
+        config = yaml.safe_load(f)
+    config["output"] = {"jsonl": "output/events.jsonl", "db": "output/events.db"}
+    if config.get("rules_file"):
+        config["rules_file"] = os.path.join(REPO_ROOT, config["rules_file"])
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix="noctilog-bench-")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        os.makedirs("output", exist_ok=True)
+        log_path = os.path.join(workdir, "audit.log")
+        written = generate(log_path, lines=args.lines, mix=args.mix, seed=args.seed)
+        config["log_files"] = [log_path]
+        with open("config.yaml", "w") as f:
+            yaml.safe_dump(config, f)
+
+        results = bench_stages(config, log_path, written)
+        with quiet():
+            results += asyncio.run(bench_dashboard(log_path, args.refreshes, args.seed))
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Scratch directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "pipeline",
+        "revision": git_revision(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"lines": written, "mix": args.mix, "seed": args.seed, "refreshes": args.refreshes},
+        "results": results,
+    }
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for item in results:
+        print(f"{item['name']:>40}: {item['items']} {item['unit']} in {item['seconds']}s "
+              f"({item['per_sec']}/s, {item['usec_per_item']} µs each)")
+
+if __name__ == "__main__":
+    main_bench()
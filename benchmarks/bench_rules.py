@@ -0,0 +1,92 @@
+"""
+Cost of the compiled rule matcher (core.rules.RuleSet) as the rule count
+grows, against evaluating each rule on its own (one pass per rule, parsing
+every line of its record type). The rule set is config/rules.yaml plus
+synthetic rules on USER_LOGIN, USER_AUTH and SYSCALL records; the log comes
+from generate_audit_log.py.
+
+    python3 benchmarks/bench_rules.py [-n LINES] [--rules 2,20,200] [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.rules import Rule, RuleSet, load_rules
+from core.auditd import parse_record
+from core.assembler import record_type
+from generate_audit_log import generate
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "rules.yaml")
+
+def synthetic_rule(i):
+    kind = i % 3
+    if kind == 0:
+        return Rule(f"login_{i}", "USER_LOGIN", "SYNTH_LOGIN", "login {acct}",
+                    match={"res": "failed", "acct": f"svc{i}"}, fields={"acct": "acct"})
+    if kind == 1:
+        return Rule(f"sudo_{i}", "USER_AUTH", "SYNTH_SUDO", "sudo {acct}",
+                    match={"exe": f"/opt/tool{i}/bin/sudo"}, fields={"acct": "acct"})
+    return Rule(f"key_{i}", "SYSCALL", "SYNTH_KEY", "exec {exe}",
+                match={"key": f"watch{i}"}, fields={"exe": "exe"})
+
+def naive_detect(rules, lines):
+    # One pass per rule, as separate detector modules would do
+    events = 0
+    for rule in rules:
+        for line in lines:
+            if record_type(line) not in rule.record_types:
+                continue
+            record = parse_record(line)
+            if record is not None and rule.matches(record):
+                events += 1
+    return events
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--lines", type=int, default=200_000, help="audit lines (default: 200000)")
+    parser.add_argument("--rules", default="2,20,200", help="rule counts to compare (default: 2,20,200)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix=".log") as tmp:
+        generate(tmp.name, lines=args.lines)
+        with open(tmp.name, "r") as f:
+            lines = f.read().splitlines()
+
+    base = load_rules(RULES_PATH).rules
+    results = []
+    for count in (int(n) for n in args.rules.split(",")):
+        rules = base + [synthetic_rule(i) for i in range(max(count - len(base), 0))]
+        ruleset = RuleSet(rules)
+        events, compiled = timed(lambda: ruleset.detect(lines))
+        naive_events, naive = timed(lambda: naive_detect(rules, lines))
+        results.append({
+            "rules": len(rules),
+            "lines": len(lines),
+            "events": len(events),
+            "compiled_seconds": round(compiled, 3),
+            "compiled_lines_per_sec": int(len(lines) / compiled),
+            "per_rule_seconds": round(naive, 3),
+            "per_rule_lines_per_sec": int(len(lines) / naive),
+        })
+        assert naive_events == len(events)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(f"{r['rules']:>4} rules: compiled {r['compiled_seconds']}s ({r['compiled_lines_per_sec']} lines/s), "
+              f"one pass per rule {r['per_rule_seconds']}s ({r['per_rule_lines_per_sec']} lines/s), {r['events']} events")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Writes a synthetic auditd log for testing and benchmarking: failed sshd
+logins (USER_LOGIN), failed sudo authentications (USER_AUTH), privileged
+execs matching the `sudo_fail` rule key (SYSCALL/EXECVE/CWD/PROCTITLE) and
+background noise (successful logins, PAM records, ordinary execve events).
+The output is deterministic for a given --seed.
+
+    python3 benchmarks/generate_audit_log.py [-o PATH] [-n LINES | --size-mb MB]
+        [--mix login=2,sudo=1,privesc=1,noise=96] [--rotate-lines N] [--num-logs K]
+        [--rate LINES_PER_SEC] [--start EPOCH] [--seed N]
+
+--rotate-lines rotates the way auditd does (PATH -> PATH.1 -> PATH.2 ...,
+keeping --num-logs files). --rate appends in real time instead of as fast
+as possible, to exercise a running noctilogd across rotations.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+DEFAULT_OUTPUT = "logs/fake_audit.log"
+DEFAULT_MIX = "login=2,sudo=1,privesc=1,noise=96"
+
+USERS = [("root", 0), ("alice", 1000), ("bob", 1001), ("carol", 1002), ("deploy", 1003), ("backup", 998)]
+ADDRS = ["203.0.113.7", "198.51.100.23", "192.0.2.45", "10.0.0.12", "172.16.4.9"]
+PROBED_ACCOUNTS = ["root", "admin", "test", "oracle", "ubuntu", "alice", "git"]
+COMMANDS = [
+    ("/usr/bin/ls", ["ls", "-la", "/tmp"]),
+    ("/usr/bin/cat", ["cat", "/etc/hostname"]),
+    ("/usr/bin/grep", ["grep", "-r", "TODO", "src"]),
+    ("/usr/bin/python3", ["python3", "-c", "print('hello world')"]),
+    ("/usr/bin/git", ["git", "status"]),
+    ("/usr/bin/id", ["id", "-u"]),
+]
+PRIVESC_COMMANDS = [
+    ("/usr/bin/id", ["id"]),
+    ("/usr/bin/cat", ["cat", "/etc/shadow"]),
+    ("/usr/bin/bash", ["bash", "-i"]),
+    ("/usr/bin/chmod", ["chmod", "u+s", "/tmp/sh"]),
+]
+UNSET_ID = 4294967295
+
+def encode(value):
+    # auditd quotes plain strings and hex-encodes ones with blanks or quotes
+    if any(c in value for c in " '\"") or not value.isprintable():
+        return value.encode("utf-8").hex().upper()
+    return f'"{value}"'
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in GENERATORS:
+            raise ValueError(f"unknown record kind {name!r} (expected one of {', '.join(GENERATORS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+class AuditLogGenerator:
+    def __init__(self, mix, start=None, seed=0, events_per_second=50.0):
+        self.random = random.Random(seed)
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.clock = float(start if start is not None else int(time.time()) - 86400)
+        self.step = 1.0 / events_per_second
+        self.serial = 1000
+
+    def header(self, rtype):
+        return f"type={rtype} msg=audit({self.clock:.3f}:{self.serial}):"
+
+    def next_event(self):
+        # One audit event (a list of records sharing timestamp and serial),
+        # or a few single-record ones in a row
+        self.clock += self.random.expovariate(1.0 / self.step)
+        self.serial += 1
+        kind = self.random.choices(self.kinds, self.weights)[0]
+        return GENERATORS[kind](self)
+
+    def user_record(self, rtype, op, acct, exe, addr, terminal, res, uid=0, auid=UNSET_ID, ses=UNSET_ID):
+        pid = self.random.randint(1000, 60000)
+        return (
+            f"{self.header(rtype)} pid={pid} uid={uid} auid={auid} ses={ses} "
+            f"subj=unconfined msg='op={op} acct={encode(acct)} exe={encode(exe)} "
+            f"hostname=? addr={addr} terminal={terminal} res={res}'"
+        )
+
+    def failed_login(self):
+        acct = self.random.choice(PROBED_ACCOUNTS)
+        return [self.user_record("USER_LOGIN", "login", acct, "/usr/sbin/sshd", self.random.choice(ADDRS), "sshd", "failed")]
+
+    def failed_sudo(self):
+        user, uid = self.random.choice(USERS[1:])
+        return [self.user_record(
+            "USER_AUTH", "PAM:authentication", user, "/usr/bin/sudo", "?",
+            f"/dev/pts/{self.random.randint(0, 5)}", "failed", uid=uid, auid=uid, ses=self.random.randint(1, 40)
+        )]
+
+    def exec_records(self, exe, argv, uid, auid, euid, key):
+        pid = self.random.randint(1000, 60000)
+        ses = self.random.randint(1, 40)
+        records = [
+            f"{self.header('SYSCALL')} arch=c000003e syscall=59 success=yes exit=0 a0=55d1 a1=55d2 a2=55d3 a3=0 "
+            f"items=2 ppid={pid - 1} pid={pid} auid={auid} uid={uid} gid={uid} euid={euid} suid={euid} "
+            f"fsuid={euid} egid={uid} sgid={uid} fsgid={uid} tty=pts0 ses={ses} comm={encode(os.path.basename(exe))} "
+            f"exe={encode(exe)} subj=unconfined key={encode(key) if key else '(null)'}",
+            f"{self.header('EXECVE')} argc={len(argv)} " + " ".join(f"a{i}={encode(arg)}" for i, arg in enumerate(argv)),
+            f"{self.header('CWD')} cwd={encode('/home/' + (self.random.choice(USERS)[0]))}",
+            f"{self.header('PATH')} item=0 name={encode(exe)} inode={self.random.randint(1000, 999999)} dev=fd:01 "
+            f"mode=0100755 ouid=0 ogid=0 rdev=00:00 nametype=NORMAL",
+            f"{self.header('PROCTITLE')} proctitle=" + "\x00".join(argv).encode("utf-8").hex().upper(),
+            # The kernel closes every multi-record event with an EOE
+            f"{self.header('EOE')}",
+        ]
+        return records
+
+    def next_serial(self):
+        # PAM's records are separate single-record events, one serial each
+        self.serial += 1
+        return self
+
+    def privesc_exec(self):
+        _, uid = self.random.choice(USERS[1:])
+        exe, argv = self.random.choice(PRIVESC_COMMANDS)
+        return self.exec_records(exe, argv, uid, uid, 0, "sudo_fail")
+
+    def noise(self):
+        roll = self.random.random()
+        user, uid = self.random.choice(USERS)
+        if roll < 0.6:
+            exe, argv = self.random.choice(COMMANDS)
+            return self.exec_records(exe, argv, uid, uid, uid, None)
+        if roll < 0.8:
+            addr = self.random.choice(ADDRS)
+            return [
+                self.user_record("USER_LOGIN", "login", user, "/usr/sbin/sshd", addr, "sshd", "success", auid=uid),
+                self.next_serial().user_record("USER_START", "PAM:session_open", user, "/usr/sbin/sshd", addr, "ssh", "success", auid=uid),
+            ]
+        return [
+            self.user_record("USER_AUTH", "PAM:authentication", user, "/usr/bin/sudo", "?", "/dev/pts/1", "success", uid=uid, auid=uid),
+            self.next_serial().user_record("CRED_ACQ", "PAM:setcred", user, "/usr/bin/sudo", "?", "/dev/pts/1", "success", uid=uid, auid=uid),
+        ]
+
+GENERATORS = {
+    "login": AuditLogGenerator.failed_login,
+    "sudo": AuditLogGenerator.failed_sudo,
+    "privesc": AuditLogGenerator.privesc_exec,
+    "noise": AuditLogGenerator.noise,
+}
+
+def rotate(path, num_logs):
+    # audit.log.(n) -> audit.log.(n+1), audit.log -> audit.log.1, like auditd
+    for n in range(num_logs - 1, 0, -1):
+        older = f"{path}.{n}"
+        if os.path.exists(older):
+            if n + 1 >= num_logs:
+                os.remove(older)
+            else:
+                os.replace(older, f"{path}.{n + 1}")
+    if os.path.exists(path):
+        if num_logs > 1:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+
+def generate(path, lines=None, size_bytes=None, mix=DEFAULT_MIX, rotate_lines=None, num_logs=5,
+             rate=None, start=None, seed=0, append=False):
+    """
+    Writes at least `lines` lines or `size_bytes` bytes (whole audit events)
+    to `path` and returns the number of lines written.
+    """
+    generator = AuditLogGenerator(parse_mix(mix) if isinstance(mix, str) else mix, start=start, seed=seed)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    written = size = in_file = 0
+    f = open(path, "a" if append else "w")
+    try:
+        while (lines is None or written < lines) and (size_bytes is None or size < size_bytes):
+            records = generator.next_event()
+            if rotate_lines and in_file and in_file + len(records) > rotate_lines:
+                f.close()
+                rotate(path, num_logs)
+                f = open(path, "w")
+                in_file = 0
+            data = "\n".join(records) + "\n"
+            f.write(data)
+            written += len(records)
+            in_file += len(records)
+            size += len(data)
+            if rate:
+                f.flush()
+                time.sleep(len(records) / rate)
+    finally:
+        f.close()
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"log path (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("-n", "--lines", type=int, help="lines to write (default: 10000 unless --size-mb)")
+    parser.add_argument("--size-mb", type=float, help="megabytes to write")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"relative weights per event kind (default: {DEFAULT_MIX})")
+    parser.add_argument("--rotate-lines", type=int, help="rotate after this many lines per file")
+    parser.add_argument("--num-logs", type=int, default=5, help="files kept when rotating (default: 5)")
+    parser.add_argument("--rate", type=float, help="append at this many lines per second")
+    parser.add_argument("--start", type=float, help="epoch of the first event (default: 24h ago)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--append", action="store_true", help="append to an existing log")
+    args = parser.parse_args()
+
+    lines = args.lines if args.lines or args.size_mb else 10000
+    size_bytes = int(args.size_mb * 1024 * 1024) if args.size_mb else None
+    try:
+        written = generate(
+            args.output, lines=lines, size_bytes=size_bytes, mix=args.mix, rotate_lines=args.rotate_lines,
+            num_logs=args.num_logs, rate=args.rate, start=args.start, seed=args.seed, append=args.append
+        )
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    except KeyboardInterrupt:
+        return
+    print(f"✅ Wrote {written} audit lines to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import re
+from collections import OrderedDict
+
+AUDIT_ID_PATTERN = re.compile(r"audit\((\d+\.\d+):(\d+)\)")
+KEY_PATTERN = re.compile(r' key=(?:"([^"]*)"|\(null\)|(\S+))')
+
+# Kernel records that belong to a multi-record event closed by EOE. Other
+# record types (USER_LOGIN, USER_AUTH, ...) are complete on their own.
+MULTI_RECORD_TYPES = {
+    "SYSCALL", "EXECVE", "CWD", "PATH", "PROCTITLE", "SOCKADDR", "OBJ_PID",
+    "BPRM_FCAPS", "CAPSET", "MMAP", "FD_PAIR", "IPC", "MQ_OPEN", "EOE",
+}
+
+MAX_PENDING = 1024
+FLUSH_TIMEOUT = 2.0
+
+def record_type(line):
+    if line.startswith("node="):
+        line = line[line.find(" ") + 1:]
+    end = line.find(" ", 5)
+    return line[5:end] if line.startswith("type=") and end > 0 else None
+
+def build_event(event_id, timestamp, records):
+    # records: list of (type, line) in arrival order
+    by_type = {}
+    for rtype, line in records:
+        by_type.setdefault(rtype, []).append(line)
+
+    key = None
+    syscall = by_type.get("SYSCALL")
+    if syscall:
+        match = KEY_PATTERN.search(syscall[0])
+        if match:
+            key = match.group(1) or match.group(2)
+
+    return {
+        "id": event_id,
+        "timestamp": timestamp,
+        "key": key,
+        "records": by_type,
+    }
+
+def open_events_start(lines, timeout=FLUSH_TIMEOUT):
+    """
+    Index of the first line of the auditd events still open at the end of
+    `lines` (no EOE yet and a record within `timeout` seconds of the newest
+    one), moved back so that no event straddles it; len(lines) when every
+    event is complete.
+    """
+    first, last, last_ts = {}, {}, {}
+    closed = set()
+    newest = None
+    for index, line in enumerate(lines):
+        rtype = record_type(line)
+        match = AUDIT_ID_PATTERN.search(line) if rtype in MULTI_RECORD_TYPES else None
+        if not match:
+            continue
+        event_id = match.group(1) + ":" + match.group(2)
+        timestamp = float(match.group(1))
+        first.setdefault(event_id, index)
+        last[event_id] = index
+        last_ts[event_id] = timestamp
+        if newest is None or timestamp > newest:
+            newest = timestamp
+        if rtype == "EOE":
+            closed.add(event_id)
+
+    starts = [first[event_id] for event_id in first
+              if event_id not in closed and newest - last_ts[event_id] <= timeout]
+    if not starts:
+        return len(lines)
+    cut = min(starts)
+    moved = True
+    while moved:
+        moved = False
+        for event_id, start in first.items():
+            if start < cut <= last[event_id]:
+                cut, moved = start, True
+    return cut
+
+class AuditEventAssembler:
+    """
+    Groups the records of one auditd event by their `audit(<ts>:<serial>)`
+    id. An event is emitted when its EOE record arrives, when no record was
+    seen for it within `timeout` seconds of audit time, or when more than
+    `max_pending` events are open (least recently updated first).
+    """
+
+    def __init__(self, max_pending=MAX_PENDING, timeout=FLUSH_TIMEOUT):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = OrderedDict()
+        # Events opened so far; each pending entry keeps its number
+        self.opened = 0
+
+    def feed(self, line, rtype=None):
+        rtype = rtype or record_type(line)
+        match = AUDIT_ID_PATTERN.search(line)
+        if not rtype or not match:
+            return []
+
+        event_id = match.group(1) + ":" + match.group(2)
+        timestamp = float(match.group(1))
+
+        if rtype == "EOE":
+            entry = self.pending.pop(event_id, None)
+            completed = [build_event(event_id, entry[0], entry[2])] if entry else []
+            return completed + self.flush_expired(timestamp)
+
+        if rtype not in MULTI_RECORD_TYPES and event_id not in self.pending:
+            return [build_event(event_id, timestamp, [(rtype, line)])]
+
+        entry = self.pending.get(event_id)
+        if entry is None:
+            entry = self.pending[event_id] = [timestamp, timestamp, [], self.opened]
+            self.opened += 1
+        else:
+            entry[1] = timestamp
+            self.pending.move_to_end(event_id)
+        entry[2].append((rtype, line))
+
+        completed = self.flush_expired(timestamp)
+        while len(self.pending) > self.max_pending:
+            old_id, (first_ts, _, records, _) = self.pending.popitem(last=False)
+            completed.append(build_event(old_id, first_ts, records))
+        return completed
+
+    def flush_expired(self, now):
+        completed = []
+        while self.pending:
+            event_id, entry = next(iter(self.pending.items()))
+            if now - entry[1] <= self.timeout:
+                break
+            self.pending.popitem(last=False)
+            completed.append(build_event(event_id, entry[0], entry[2]))
+        return completed
+
+    def oldest_open(self):
+        # Number of the oldest event still pending, None when none is
+        return min((entry[3] for entry in self.pending.values()), default=None)
+
+    def flush(self):
+        completed = [build_event(event_id, entry[0], entry[2]) for event_id, entry in self.pending.items()]
+        self.pending.clear()
+        return completed
@@ -0,0 +1,180 @@
+import os
+import re
+import sys
+import zlib
+import asyncio
+from core import log
+from core.log_reader import split_lines
+from core.sources import Source
+from core.tailer import MAX_READ_BYTES
+
+FILE = "file"
+SOCKET = "socket"
+STDIN = "stdin"
+MODES = (FILE, SOCKET, STDIN)
+
+# Where auditd's af_unix plugin listens (/etc/audit/plugins.d/af_unix.conf)
+SOCKET_PATH = "/var/run/audispd_events"
+RECONNECT_INTERVAL = 5.0
+READ_BYTES = 1024 * 1024
+
+AUDIT_ID = re.compile(r"audit\((\d+(?:\.\d+)?):(\d+)\)")
+
+class RecordStream:
+    """
+    The dispatcher's record stream (plugin `string` format: one audit.log
+    line per record) read in chunks of whatever has arrived. Only complete
+    lines are returned, a partial trailing line waits for the next chunk.
+    """
+
+    def __init__(self, reader, writer=None):
+        self.reader = reader
+        self.writer = writer
+        self.partial = b""
+
+    async def read(self, timeout):
+        # Lines received; [] when nothing came within `timeout`, None once the stream ended
+        try:
+            data = await asyncio.wait_for(self.reader.read(READ_BYTES), timeout)
+        except asyncio.TimeoutError:
+            return []
+        if not data:
+            return None
+        data = self.partial + data
+        cut = data.rfind(b"\n") + 1
+        self.partial = data[cut:]
+        return split_lines(data[:cut])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+async def open_stream(mode, socket_path=SOCKET_PATH):
+    # Raises OSError (socket missing or refused) or ValueError (stdin is not a pipe)
+    if mode == SOCKET:
+        reader, writer = await asyncio.open_unix_connection(socket_path, limit=READ_BYTES)
+        return RecordStream(reader, writer)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=READ_BYTES)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+    return RecordStream(reader)
+
+def record_id(line):
+    # (timestamp, serial) of an audit record, None for anything else
+    match = AUDIT_ID.search(line)
+    return None if match is None else (float(match.group(1)), int(match.group(2)))
+
+def record_crc(line):
+    # The record without the fields an enriched log appends after \x1d
+    return zlib.crc32(line.split("\x1d", 1)[0].strip().encode("utf-8", "replace"))
+
+def streamed_path(offset_path):
+    # output/log_offset.txt -> output/log_offset.streamed.txt
+    base, ext = os.path.splitext(offset_path)
+    return f"{base}.streamed{ext}"
+
+class AudispSource(Source):
+    """
+    audit.log fed by auditd's dispatcher instead of read back from disk:
+    records arrive on noctilogd's stdin when it runs as an auditd plugin, or
+    from the af_unix plugin's socket. The file stays the fallback. It is
+    read up to its end before the feed is followed (the feed only carries
+    new records) and tailed again while the feed is unavailable.
+
+    The two overlap where one takes over from the other: records written
+    between connecting and reaching the end of the file come both ways, and
+    the file is tailed again from where the feed took over. unseen() drops
+    the records whose audit(ts:serial) id was already delivered, and those
+    of the newest id delivered that were among its records. The file offset
+    stays where the feed took over, so that id and its records' checksums
+    are committed next to it (log_offset.streamed.txt for log_offset.txt);
+    after a restart the records up to them are skipped instead of being
+    detected and counted again.
+    """
+
+    def __init__(self, path, fmt, engine, offset_path, tail_lines=200, max_read_bytes=MAX_READ_BYTES,
+                 mode=SOCKET, socket_path=SOCKET_PATH):
+        super().__init__(path, fmt, engine, offset_path, tail_lines, max_read_bytes)
+        self.mode = mode
+        self.socket_path = socket_path
+        self.streaming = False
+        self.streamed_path = streamed_path(offset_path)
+        self.last_id, self.last_records = self.load_streamed()
+        self.warned = False
+
+    @property
+    def feed(self):
+        return self.socket_path if self.mode == SOCKET else "stdin"
+
+    @property
+    def last_streamed(self):
+        # What a checkpoint commits: "<ts>:<serial> <crc32>..."
+        if self.last_id is None:
+            return None
+        ts, serial = self.last_id
+        return " ".join([f"{ts:.3f}:{serial}"] + [f"{crc:08x}" for crc in sorted(self.last_records)])
+
+    async def connect(self):
+        try:
+            stream = await open_stream(self.mode, self.socket_path)
+        except (OSError, ValueError) as e:
+            if not self.warned:
+                log.warning(f"audisp feed {self.feed} unavailable ({e}); tailing {self.path} instead.")
+                self.warned = True
+            return None
+        log.info(f"Reading audit records from the audisp feed {self.feed}.")
+        self.warned = False
+        return stream
+
+    def feed_closed(self):
+        # Back to tailing the file, from where it was left when the feed took over
+        self.streaming = False
+        log.warning(f"audisp feed {self.feed} closed; tailing {self.path} instead.")
+
+    def load_streamed(self):
+        try:
+            with open(self.streamed_path, "r") as f:
+                stamp, *crcs = f.read().split()
+            return record_id(f"audit({stamp})"), {int(crc, 16) for crc in crcs}
+        except (OSError, ValueError):
+            return None, set()
+
+    def commit_streamed(self, streamed):
+        directory = os.path.dirname(self.streamed_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.streamed_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{streamed}\n")
+        os.replace(tmp_path, self.streamed_path)
+
+    def unseen(self, lines):
+        kept = []
+        for line in lines:
+            record = record_id(line)
+            if record is None:
+                kept.append(line)
+                continue
+            if self.last_id is not None and record != self.last_id:
+                # Delivered already if both its time and its serial are
+                # behind (the serial restarts at boot, the clock can be set back)
+                if record[0] <= self.last_id[0] and record[1] <= self.last_id[1]:
+                    continue
+            if record != self.last_id:
+                self.last_id, self.last_records = record, set()
+            crc = record_crc(line)
+            if crc in self.last_records:
+                continue
+            self.last_records.add(crc)
+            kept.append(line)
+        return kept
+
+    def read(self):
+        # One tailer read per call, like any source: a long stretch of
+        # records the feed delivered is skipped one read budget at a time.
+        # The tailer still moves, so the caller can commit the skip.
+        return self.unseen(super().read())
+
+    def lag(self):
+        # The file is not followed while the feed is
+        return 0 if self.streaming else super().lag()
@@ -0,0 +1,170 @@
+import re
+
+# node=<host> (optional) type=<TYPE> msg=audit(<seconds>.<millis>:<serial>):
+HEADER_PATTERN = re.compile(r"(?:node=(\S+) )?type=(\S+) msg=audit\((\d+(?:\.\d+)?):(\d+)\):")
+
+# key=value tokens; a quoted value may contain blanks
+FIELD_PATTERN = re.compile(r"([\w-]+)=('[^']*'|\"[^\"]*\"|\S*)")
+
+# Fields auditd logs as untrusted strings: quoted when plain, hex-encoded
+# when they contain spaces, quotes or control characters.
+ENCODED_FIELDS = {
+    "acct", "cmd", "comm", "cwd", "data", "exe", "key", "name", "new",
+    "ocomm", "old", "path", "proctitle", "watch",
+}
+
+# A key only counts at the start of a token: the body start, after a blank,
+# after the quote opening a nested msg, or after the ENRICHED-format
+# separator. This keeps `uid=` from matching inside `auid=`.
+KEY_BOUNDARY = " '\x1d"
+
+def is_encoded(key, rtype=None):
+    # EXECVE arguments (a0, a1, a2[0], ...) are encoded like the named
+    # fields; a0-a3 of other records (SYSCALL registers) are plain hex numbers
+    if key in ENCODED_FIELDS:
+        return True
+    return rtype == "EXECVE" and key[0] == "a" and key[1:2].isdigit()
+
+def decode_value(key, value, rtype=None):
+    first = value[:1]
+    if first == '"' or first == "'":
+        return value[1:-1]
+    if is_encoded(key, rtype):
+        if value == "(null)":
+            return None
+        try:
+            # NUL separates proctitle arguments
+            return bytes.fromhex(value).decode("utf-8", errors="replace").replace("\x00", " ")
+        except ValueError:
+            return value
+    return value
+
+def tokenize(text):
+    # One regex pass. A split on blanks and "=" measured no faster once it
+    # has to verify that every token holds exactly one "=" (`a=b=c d`
+    # would otherwise shift keys and values).
+    return dict(FIELD_PATTERN.findall(text))
+
+class AuditRecord:
+    """
+    One auditd record. Type, timestamp and serial are parsed up front; a
+    field is located in the body only when it is read, and unquoted or
+    hex-decoded at that point. Fields of a nested `msg='...'` (user-space
+    records such as USER_AUTH) are read like outer ones, the first
+    occurrence of a key wins. `fields` tokenizes the whole body once for
+    callers that need every field.
+    """
+
+    __slots__ = ("node", "type", "ts", "serial", "body", "tokens")
+
+    def __init__(self, node, rtype, ts, serial, body):
+        self.node = node
+        self.type = rtype
+        self.ts = ts
+        self.serial = serial
+        self.body = body
+        self.tokens = None
+
+    @property
+    def timestamp(self):
+        return float(self.ts)
+
+    @property
+    def id(self):
+        return self.ts + ":" + self.serial
+
+    @property
+    def fields(self):
+        if self.tokens is None:
+            body = self.body
+            start = body.find("msg='")
+            end = body.rfind("'")
+            if start >= 0 and end > start + 4 and (start == 0 or body[start - 1] in KEY_BOUNDARY):
+                # Later segments first so earlier occurrences overwrite them
+                tokens = tokenize(body[end + 1:].strip())
+                tokens.update(tokenize(body[start + 5:end]))
+                tokens["msg"] = body[start + 4:end + 1]
+                tokens.update(tokenize(body[:start].strip()))
+            else:
+                tokens = tokenize(body)
+            self.tokens = tokens
+        return self.tokens
+
+    def raw(self, key, default=None):
+        tokens = self.tokens
+        if tokens is not None:
+            return tokens.get(key, default)
+
+        body = self.body
+        needle = key + "="
+        index = body.find(needle)
+        while index > 0 and body[index - 1] not in KEY_BOUNDARY:
+            index = body.find(needle, index + 1)
+        if index < 0:
+            return default
+
+        index += len(needle)
+        first = body[index:index + 1]
+        if first == '"':
+            end = body.find('"', index + 1) + 1 or len(body)
+        elif first == "'":
+            end = body.rfind("'") + 1
+        else:
+            end = body.find(" ", index)
+            if end < 0:
+                end = len(body)
+            # Last field of a nested msg: drop its closing quote
+            if body[end - 1] == "'":
+                end -= 1
+        return body[index:end]
+
+    def get(self, key, default=None):
+        # The detectors' hot path: `raw` and `decode_value` inlined, so a
+        # plain field costs one find and one slice
+        if self.tokens is not None:
+            value = self.tokens.get(key)
+            if value is None:
+                return default
+            return decode_value(key, value, self.type)
+
+        body = self.body
+        needle = key + "="
+        index = body.find(needle)
+        while index > 0 and body[index - 1] not in KEY_BOUNDARY:
+            index = body.find(needle, index + 1)
+        if index < 0:
+            return default
+
+        index += len(needle)
+        first = body[index:index + 1]
+        if first == '"':
+            end = body.find('"', index + 1)
+            return body[index + 1:end if end >= 0 else len(body)]
+        if first == "'":
+            return body[index + 1:body.rfind("'")]
+        end = body.find(" ", index)
+        if end < 0:
+            end = len(body)
+        # Last field of a nested msg: drop its closing quote
+        if body[end - 1] == "'":
+            end -= 1
+        value = body[index:end]
+        if key in ENCODED_FIELDS or (self.type == "EXECVE" and key[0] == "a" and key[1:2].isdigit()):
+            return decode_value(key, value, self.type)
+        return value
+
+    def __contains__(self, key):
+        return self.raw(key) is not None
+
+    def __repr__(self):
+        return f"AuditRecord({self.type} {self.id} {self.body!r})"
+
+def parse_record(line):
+    match = HEADER_PATTERN.match(line)
+    if match is None:
+        return None
+    body = line[match.end():].strip()
+    if "\x1d" in body:
+        body = body.replace("\x1d", " ")
+    node, rtype, ts, serial = match.groups()
+    return AuditRecord(node, rtype, ts, serial, body)
@@ -0,0 +1,23 @@
+from collections import defaultdict
+from core import log
+
+# Minimal in-process publish/subscribe used by the pipeline sinks and the
+# dashboard to announce inserted and acknowledged events.
+EVENTS_INSERTED = "events_inserted"
+EVENT_ACKNOWLEDGED = "event_acknowledged"
+
+_subscribers = defaultdict(list)
+
+def subscribe(topic, callback):
+    _subscribers[topic].append(callback)
+
+def unsubscribe(topic, callback):
+    if callback in _subscribers[topic]:
+        _subscribers[topic].remove(callback)
+
+def publish(topic, payload):
+    for callback in list(_subscribers[topic]):
+        try:
+            callback(payload)
+        except Exception as e:
+            log.error(f"[Bus] {topic} subscriber failed: {e}")
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from core import db
+from core.threshold import event_time, isoformat
+
+DEFAULT_WINDOW = 60
+DEFAULT_FIELDS = ("user", "exe", "pid")
+MAX_OPEN = 10000
+
+# Values that say nothing about who or what caused the event
+EMPTY_VALUES = (None, "", "N/A", "—")
+
+def coalesce_key(event, fields):
+    extra = event.get("extra", {})
+    values = [extra.get(field) for field in fields]
+    if all(value in EMPTY_VALUES for value in values):
+        return None
+    return "|".join([event.get("event_type") or ""] + ["" if value is None else str(value) for value in values])
+
+class StormCoalescer:
+    """
+    Collapses repeated events (same type and same `fields`, by default user,
+    exe and pid) seen within `window` seconds of the first one into a single
+    record carrying `count`, `first_seen` and `last_seen`.
+
+    `process` returns the records to insert and the count updates for
+    records stored by an earlier call. Open records are looked up in memory
+    first and then in SQLite, so a storm spanning several one-shot runs still
+    lands in one row. The caller must store the returned records before the
+    next call, and drop events it has seen before (main.unseen_events):
+    only a record's own first event is recognized here when read again.
+    """
+
+    def __init__(self, conn, window=DEFAULT_WINDOW, fields=DEFAULT_FIELDS, max_open=MAX_OPEN):
+        self.conn = conn
+        self.window = window
+        self.fields = tuple(fields)
+        self.max_open = max_open
+        # coalesce key -> [event_hash, first seen (epoch), record dict while unsaved]
+        self.open = OrderedDict()
+        self.coalesced = 0
+
+    @classmethod
+    def from_config(cls, conn, config):
+        section = config.get("coalesce") or {}
+        return cls(
+            conn,
+            window=section.get("window", DEFAULT_WINDOW),
+            fields=section.get("fields", DEFAULT_FIELDS),
+        )
+
+    def lookup(self, key, ts):
+        entry = self.open.get(key)
+        if entry is not None and abs(ts - entry[1]) <= self.window:
+            self.open.move_to_end(key)
+            return entry
+
+        row = db.find_open_record(self.conn, key, isoformat(ts - self.window))
+        if row is not None:
+            first_ts = event_time({"timestamp": row[1]})
+            if first_ts is not None and abs(ts - first_ts) <= self.window:
+                entry = self.open[key] = [row[0], first_ts, None]
+                return entry
+        return None
+
+    def process(self, events):
+        if not self.window or self.window <= 0:
+            return events, []
+
+        records = []
+        merges = {}
+        for event in events:
+            key = coalesce_key(event, self.fields)
+            ts = event_time(event)
+            if key is None or ts is None:
+                records.append(event)
+                continue
+
+            entry = self.lookup(key, ts)
+            if entry is None:
+                event["count"] = 1
+                event["first_seen"] = event["last_seen"] = event["timestamp"]
+                event["coalesce_key"] = key
+                records.append(event)
+                self.open[key] = [event["event_hash"], ts, event]
+                continue
+
+            if entry[0] == event.get("event_hash"):
+                # The record's own first event, read again
+                continue
+
+            self.coalesced += 1
+            record = entry[2]
+            if record is not None:
+                record["count"] += 1
+                record["last_seen"] = max(record["last_seen"], event["timestamp"])
+            else:
+                merge = merges.setdefault(entry[0], [0, event["timestamp"]])
+                merge[0] += 1
+                merge[1] = max(merge[1], event["timestamp"])
+
+        # From the next call on, this batch's records are in the database
+        for entry in self.open.values():
+            entry[2] = None
+        self.prune()
+        return records, [(count, last_seen, event_hash) for event_hash, (count, last_seen) in merges.items()]
+
+    def prune(self):
+        if not self.open:
+            return
+        newest = max(entry[1] for entry in self.open.values())
+        for key in [key for key, entry in self.open.items() if newest - entry[1] > self.window]:
+            del self.open[key]
+        while len(self.open) > self.max_open:
+            self.open.popitem(last=False)
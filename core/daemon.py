@@ -0,0 +1,70 @@
+import os
+import signal
+import asyncio
+from core import log, metrics
+from core.pipeline import Pipeline
+
+PID_PATH = "output/noctilogd.pid"
+
+def daemon_running(pid_path=PID_PATH):
+    try:
+        with open(pid_path, "r") as f:
+            pid = int(f.read().strip())
+        os.kill(pid, 0)
+        return pid != os.getpid()
+    except (OSError, ValueError):
+        return False
+
+def write_pid(pid_path=PID_PATH):
+    os.makedirs(os.path.dirname(pid_path), exist_ok=True)
+    with open(pid_path, "w") as f:
+        f.write(f"{os.getpid()}\n")
+
+def remove_pid(pid_path=PID_PATH):
+    try:
+        os.remove(pid_path)
+    except OSError:
+        pass
+
+class Daemon:
+    """
+    Follows the configured log files and processes lines as they are
+    appended. Config, detectors, the tailer offsets, the DB connection and
+    the dedup/tombstone sets are loaded once and stay warm for the life of
+    the process; the work itself runs as an asyncio pipeline (see
+    core.pipeline).
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.pipeline = Pipeline(config)
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.pipeline.stop)
+        await self.pipeline.run()
+
+    def serve_metrics(self):
+        listen = (self.config.get("metrics") or {}).get("listen")
+        if not listen:
+            return None
+        try:
+            server = metrics.serve(listen)
+        except (OSError, ValueError) as e:
+            log.error(f"Metrics endpoint on {listen} not started: {e}")
+            return None
+        log.info(f"Metrics served on http://{listen}/metrics.")
+        return server
+
+    def run(self):
+        write_pid()
+        log.info(f"noctilogd started (pid {os.getpid()}).")
+        server = self.serve_metrics()
+        try:
+            asyncio.run(self.serve())
+        finally:
+            if server:
+                server.shutdown()
+            remove_pid()
+            log.info("noctilogd stopped.")
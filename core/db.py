@@ -1,15 +1,185 @@
 import sqlite3
 import json
-import hashlib
+import time
+import threading
+from core import metrics, log
+from core.hash_utils import generate_event_hash
 
-def generate_event_hash(event):
-    h = hashlib.sha256()
-    content = f"{event.get('event_type')}|{event.get('message')}|{json.dumps(event.get('extra', {}), sort_keys=True)}"
-    h.update(content.encode("utf-8"))
-    return h.hexdigest()
+SCHEMA_VERSION = 7
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5
+
+EVENT_COLUMNS = (
+    "timestamp, event_type, message, source, severity, acknowledged, extra_data, event_hash, viewed, "
+    "count, first_seen, last_seen, process"
+)
+
+INSERT_SQL = """
+    INSERT OR IGNORE INTO events (
+        timestamp, event_type, message, source, severity,
+        acknowledged, extra_data, event_hash,
+        count, first_seen, last_seen, coalesce_key, severity_rank, process
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Dashboard "severity" sort order; anything unknown ranks as medium
+SEVERITY_RANKS = {"high": 3, "medium": 2, "low": 1}
+
+# extra.user values that do not name anybody, left out of the top users
+ANONYMOUS_USERS = "('', '—', 'N/A', 'unknown')"
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    if version < 1:
+        # Rows written before the shared hash used a timestamp-less hash of
+        # their own: recompute them so DB, JSONL and tombstones agree.
+        rows = conn.execute("SELECT id, timestamp, event_type, message, extra_data FROM events").fetchall()
+        updates = []
+        for row_id, timestamp, event_type, message, extra_data in rows:
+            try:
+                extra = json.loads(extra_data or "{}")
+            except ValueError:
+                extra = {}
+            event = {"timestamp": timestamp or "", "event_type": event_type, "message": message, "extra": extra}
+            updates.append((generate_event_hash(event), row_id))
+        conn.executemany("UPDATE OR IGNORE events SET event_hash = ? WHERE id = ?", updates)
+
+    if version < 2:
+        # Dashboard filters and sort orders are served from these indexes
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_type ON events(event_type, timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_severity ON events(severity)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_acknowledged ON events(acknowledged)")
+
+    if version < 3:
+        # Triage state lives next to the event and is changed by hash with a
+        # single UPDATE; deleted rows stay as tombstones so INSERT OR IGNORE
+        # never brings them back.
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+        if "viewed" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN viewed INTEGER DEFAULT 0")
+        if "deleted" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN deleted INTEGER DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_viewed ON events(viewed, id)")
+
+    if version < 4:
+        # Storm coalescing: one row stands for `count` identical events
+        # seen between first_seen and last_seen (see core.coalesce).
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+        if "count" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN count INTEGER DEFAULT 1")
+        if "first_seen" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN first_seen TEXT")
+        if "last_seen" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN last_seen TEXT")
+        if "coalesce_key" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN coalesce_key TEXT")
+        conn.execute("UPDATE events SET first_seen = timestamp, last_seen = timestamp WHERE first_seen IS NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_coalesce ON events(coalesce_key, first_seen)")
+
+    if version < 5:
+        # Dashboard statistics: per hour/type/severity and per user totals of
+        # live rows, kept current by triggers on every insert, count merge,
+        # acknowledge and delete, whichever process writes.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats_hourly (
+                hour TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                severity TEXT NOT NULL,
+                records INTEGER NOT NULL DEFAULT 0,
+                events INTEGER NOT NULL DEFAULT 0,
+                unacknowledged INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (hour, event_type, severity)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats_users (
+                user TEXT NOT NULL PRIMARY KEY,
+                events INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_stats_users_events ON stats_users(events)")
+        conn.execute("DELETE FROM stats_hourly")
+        conn.execute("DELETE FROM stats_users")
+        conn.execute("""
+            INSERT INTO stats_hourly (hour, event_type, severity, records, events, unacknowledged)
+            SELECT COALESCE(substr(timestamp, 1, 13), ''), COALESCE(event_type, ''), COALESCE(severity, ''),
+                   COUNT(*), SUM(COALESCE(count, 1)), SUM(acknowledged = 0)
+            FROM events WHERE deleted = 0 GROUP BY 1, 2, 3
+        """)
+        conn.execute(f"""
+            INSERT INTO stats_users (user, events)
+            SELECT user, SUM(events) FROM (
+                SELECT CASE WHEN json_valid(extra_data) THEN json_extract(extra_data, '$.user') END AS user,
+                       COALESCE(count, 1) AS events
+                FROM events WHERE deleted = 0
+            ) WHERE user IS NOT NULL AND user NOT IN {ANONYMOUS_USERS} GROUP BY user
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stats_on_insert AFTER INSERT ON events BEGIN
+                {stats_delta_sql("NEW", "+")}
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stats_on_update AFTER UPDATE OF count, acknowledged, deleted ON events BEGIN
+                {stats_delta_sql("OLD", "-")}
+                {stats_delta_sql("NEW", "+")}
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stats_on_delete AFTER DELETE ON events BEGIN
+                {stats_delta_sql("OLD", "-")}
+            END
+        """)
+
+    if version < 6:
+        # The severity sort pages through an index instead of sorting every
+        # row by a CASE expression
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+        if "severity_rank" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN severity_rank INTEGER DEFAULT 2")
+        conn.execute("UPDATE events SET severity_rank = CASE severity WHEN 'high' THEN 3 WHEN 'low' THEN 1 ELSE 2 END")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_severity_rank ON events(severity_rank, id)")
+        # Added to v3 after databases were migrated past it
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_viewed ON events(viewed, id)")
+
+    if version < 7:
+        # The /proc snapshot enrichment attached (exe, cmdline, ppid, start)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+        if "process" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN process TEXT")
+
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def stats_delta_sql(row, sign):
+    # Adds (sign "+") or takes back (sign "-") what `row` contributes to the
+    # statistics tables: nothing once it is soft-deleted.
+    live = f"({row}.deleted = 0)"
+    return f"""
+        INSERT INTO stats_hourly (hour, event_type, severity, records, events, unacknowledged)
+        VALUES (
+            COALESCE(substr({row}.timestamp, 1, 13), ''), COALESCE({row}.event_type, ''), COALESCE({row}.severity, ''),
+            {sign}{live}, {sign}{live} * COALESCE({row}.count, 1), {sign}({live} AND {row}.acknowledged = 0)
+        )
+        ON CONFLICT (hour, event_type, severity) DO UPDATE SET
+            records = records + excluded.records,
+            events = events + excluded.events,
+            unacknowledged = unacknowledged + excluded.unacknowledged;
+        INSERT INTO stats_users (user, events)
+        SELECT user, {sign}{live} * COALESCE({row}.count, 1) FROM (
+            SELECT CASE WHEN json_valid({row}.extra_data) THEN json_extract({row}.extra_data, '$.user') END AS user
+        ) WHERE user IS NOT NULL AND user NOT IN {ANONYMOUS_USERS}
+        ON CONFLICT (user) DO UPDATE SET events = events + excluded.events;
+    """
 
 def init_db(db_path):
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     cur = conn.cursor()
     cur.execute("""
         CREATE TABLE IF NOT EXISTS events (
@@ -24,31 +194,223 @@ def init_db(db_path):
             event_hash TEXT UNIQUE
         )
     """)
-    conn.commit()
+    with conn:
+        migrate(conn)
     return conn
 
+def get_connection(db_path):
+    # One long-lived connection per database file, shared by every cycle.
+    with _connections_lock:
+        conn = _connections.get(db_path)
+        if conn is None:
+            conn = _connections[db_path] = init_db(db_path)
+        return conn
+
+def event_row(event):
+    return (
+        event.get("timestamp"),
+        event.get("event_type"),
+        event.get("message"),
+        event.get("source"),
+        event.get("severity"),
+        int(event.get("acknowledged", False)),
+        json.dumps(event.get("extra", {})),
+        event.get("event_hash") or generate_event_hash(event),
+        event.get("count", 1),
+        event.get("first_seen") or event.get("timestamp"),
+        event.get("last_seen") or event.get("timestamp"),
+        event.get("coalesce_key"),
+        SEVERITY_RANKS.get(event.get("severity"), 2),
+        json.dumps(event["process"]) if event.get("process") else None
+    )
+
+def insert_events(conn, events):
+    try:
+        with conn:
+            conn.executemany(INSERT_SQL, (event_row(event) for event in events))
+    except Exception as e:
+        log.error(f"[DB] Failed to insert events: {e}")
+
 def insert_event(conn, event):
     try:
-        cur = conn.cursor()
-        event_hash = generate_event_hash(event)
-        extra_json = json.dumps(event.get("extra", {}))
-        acknowledged = int(event.get("acknowledged", False))
-
-        cur.execute("""
-            INSERT OR IGNORE INTO events (
-                timestamp, event_type, message, source, severity,
-                acknowledged, extra_data, event_hash
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            event.get("timestamp"),
-            event.get("event_type"),
-            event.get("message"),
-            event.get("source"),
-            event.get("severity"),
-            acknowledged,
-            extra_json,
-            event_hash
-        ))
-        conn.commit()
+        with conn:
+            conn.execute(INSERT_SQL, event_row(event))
     except Exception as e:
-        print(f"[DB Error] Failed to insert event: {e}")
+        log.error(f"[DB] Failed to insert event: {e}")
+
+def row_to_event(row):
+    (timestamp, event_type, message, source, severity, acknowledged, extra_data, event_hash, viewed,
+     count, first_seen, last_seen, process) = row
+    try:
+        extra = json.loads(extra_data or "{}")
+    except ValueError:
+        extra = {}
+    event = {
+        "timestamp": timestamp,
+        "event_type": event_type,
+        "message": message,
+        "source": source,
+        "severity": severity,
+        "extra": extra,
+        "acknowledged": bool(acknowledged),
+        "event_hash": event_hash,
+        "viewed": bool(viewed),
+        "count": count or 1,
+        "first_seen": first_seen or timestamp,
+        "last_seen": last_seen or timestamp
+    }
+    if process:
+        try:
+            event["process"] = json.loads(process)
+        except ValueError:
+            pass
+    return event
+
+def query_page(conn, where="", params=(), keys=("id",), descending=False, limit=100, after=None):
+    """
+    One page of live events ordered by `keys`, one unique column (id) or a
+    column and id as tiebreaker, all ascending or all descending, starting
+    after the row whose key values are `after`. Returns (key values, event)
+    pairs; the key values of the last one start the next page. Each part is
+    an index seek, so a page costs the same at any depth, unlike OFFSET:
+    the rest of the current value of the first column, then the values
+    after it.
+    """
+    op = "<" if descending else ">"
+    if after is None:
+        return select_page(conn, where, params, keys, descending, limit)
+    if len(keys) == 1:
+        return select_page(conn, where, params, keys, descending, limit, f"{keys[0]} {op} ?", after)
+    first, tiebreak = keys
+    rows = select_page(conn, where, params, keys, descending, limit,
+                       f"{first} = ? AND {tiebreak} {op} ?", after)
+    if len(rows) < limit:
+        rows += select_page(conn, where, params, keys, descending, limit - len(rows), f"{first} {op} ?", after[:1])
+    return rows
+
+def select_page(conn, where, params, keys, descending, limit, bound=None, bound_params=()):
+    sql = f"SELECT {', '.join(keys)}, {EVENT_COLUMNS} FROM events WHERE deleted = 0"
+    args = list(params)
+    if where:
+        sql += f" AND {where}"
+    if bound:
+        sql += f" AND {bound}"
+        args += bound_params
+    direction = " DESC" if descending else ""
+    sql += " ORDER BY " + ", ".join(key + direction for key in keys) + " LIMIT ?"
+    args.append(limit)
+    return [(tuple(row[:len(keys)]), row_to_event(row[len(keys):])) for row in conn.execute(sql, args)]
+
+def live_count(conn, event_type=None):
+    # Live rows, from the hourly statistics instead of a COUNT(*) scan
+    sql = "SELECT COALESCE(SUM(records), 0) FROM stats_hourly"
+    if event_type is None:
+        return conn.execute(sql).fetchone()[0]
+    return conn.execute(sql + " WHERE event_type = ?", (event_type,)).fetchone()[0]
+
+def unacknowledged_counts(conn):
+    # Unacknowledged live rows per severity, from the hourly statistics
+    rows = conn.execute(
+        "SELECT severity, SUM(unacknowledged) FROM stats_hourly GROUP BY severity HAVING SUM(unacknowledged) > 0"
+    )
+    return dict(rows.fetchall())
+
+def hourly_counts(conn, since_hour):
+    # (hour, event_type, events) for hours >= `since_hour` ("YYYY-MM-DDTHH")
+    return conn.execute(
+        "SELECT hour, event_type, SUM(events) FROM stats_hourly WHERE hour >= ? GROUP BY hour, event_type",
+        (since_hour,)
+    ).fetchall()
+
+def top_users(conn, limit=5):
+    return conn.execute(
+        "SELECT user, events FROM stats_users WHERE events > 0 ORDER BY events DESC LIMIT ?", (limit,)
+    ).fetchall()
+
+def max_event_id(conn):
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+def events_since(conn, last_id):
+    # Rows added after `last_id`, e.g. by noctilogd in another process
+    rows = conn.execute(
+        f"SELECT id, {EVENT_COLUMNS} FROM events WHERE id > ? AND deleted = 0 ORDER BY id", (last_id,)
+    ).fetchall()
+    return [(row[0], row_to_event(row[1:])) for row in rows]
+
+def find_open_record(conn, coalesce_key, since):
+    # Latest live record for `coalesce_key` whose window started at or after `since`
+    return conn.execute(
+        "SELECT event_hash, first_seen, last_seen, count FROM events "
+        "WHERE coalesce_key = ? AND first_seen >= ? AND deleted = 0 ORDER BY id DESC LIMIT 1",
+        (coalesce_key, since)
+    ).fetchone()
+
+def merge_counts(conn, merges):
+    # merges: (added count, last_seen, event_hash) for records already stored
+    with conn:
+        conn.executemany(
+            "UPDATE events SET count = count + ?, last_seen = MAX(COALESCE(last_seen, timestamp), ?) WHERE event_hash = ?",
+            merges
+        )
+
+def set_acknowledged(conn, event_hash, acknowledged):
+    with conn:
+        conn.execute("UPDATE events SET acknowledged = ?, viewed = 1 WHERE event_hash = ?", (int(acknowledged), event_hash))
+
+def set_viewed(conn, event_hash):
+    with conn:
+        conn.execute("UPDATE events SET viewed = 1 WHERE event_hash = ?", (event_hash,))
+
+def delete_event(conn, event_hash):
+    with conn:
+        conn.execute("UPDATE events SET deleted = 1 WHERE event_hash = ?", (event_hash,))
+
+def import_viewed_ids(conn, viewed_ids):
+    # Legacy viewed_ids.json entries are "<timestamp><event_type>" strings
+    with conn:
+        conn.executemany(
+            "UPDATE events SET viewed = 1 WHERE timestamp || event_type = ?",
+            ((viewed_id,) for viewed_id in viewed_ids)
+        )
+
+class EventWriter:
+    """
+    Buffers event rows and writes them with one executemany per transaction.
+    A batch is committed when `batch_size` rows are pending, when the oldest
+    pending row is `flush_interval` seconds old, or on an explicit `flush`
+    (end of an analysis cycle), so a burst costs a few fsyncs, not one per row.
+    """
+
+    def __init__(self, conn, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.first_pending_at = None
+        self.lock = threading.Lock()
+
+    def add(self, event):
+        with self.lock:
+            if not self.pending:
+                self.first_pending_at = time.monotonic()
+            self.pending.append(event_row(event))
+            due = len(self.pending) >= self.batch_size
+        if due or self.is_stale():
+            self.flush()
+
+    def is_stale(self):
+        return self.pending and time.monotonic() - self.first_pending_at >= self.flush_interval
+
+    def flush(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+        if not rows:
+            return 0
+        try:
+            with metrics.time_stage("db_insert"), self.conn:
+                self.conn.executemany(INSERT_SQL, rows)
+        except Exception as e:
+            log.error(f"[DB] Failed to insert {len(rows)} event(s): {e}")
+            return 0
+        metrics.ROWS_INSERTED.inc(len(rows))
+        return len(rows)
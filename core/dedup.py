@@ -0,0 +1,133 @@
+import os
+import fcntl
+from contextlib import contextmanager
+from core.segments import get_event_log
+
+class HashIndex:
+    """
+    In-memory set of event hashes backed by an append-only sidecar file
+    (one hash per line). Loaded once, then updated incrementally, so
+    membership checks are O(1) instead of a scan of the event log.
+
+    Several processes share the file. A rewrite replaces it with a new
+    inode under an exclusive flock on `<path>.lock`; appends hold the lock
+    shared and reopen the file first if it was replaced, so no append
+    lands in a file that was already swapped out.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = set()
+        self.file = None
+        self.lock_file = None
+        self.inode = None
+        self.offset = 0
+        self.line_count = 0
+        self.refresh()
+
+    @contextmanager
+    def locked(self, operation):
+        if self.lock_file is None:
+            self.lock_file = open(self.path + ".lock", "a")
+        fcntl.flock(self.lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        # Picks up hashes appended by other processes since the last call;
+        # a file that was replaced (compacted) is reloaded from the start.
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        size = st.st_size
+        if st.st_ino != self.inode or size < self.offset:
+            self.hashes, self.offset, self.line_count = set(), 0, 0
+            self.inode = st.st_ino
+        if size == self.offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        data = data[:data.rfind(b"\n") + 1]
+        self.offset += len(data)
+        for line in data.decode("utf-8", errors="replace").split():
+            self.hashes.add(line)
+            self.line_count += 1
+
+    def __contains__(self, event_hash):
+        return event_hash in self.hashes
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, event_hash):
+        if event_hash in self.hashes:
+            return False
+        self.hashes.add(event_hash)
+        with self.locked(fcntl.LOCK_SH):
+            if self.file is not None and self.replaced():
+                self.close()
+            if self.file is None:
+                self.file = open(self.path, "a", buffering=1)
+            self.file.write(event_hash + "\n")
+        return True
+
+    def replaced(self):
+        # The open file is no longer the one at `path` (rewritten or removed)
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.file.fileno()).st_ino
+        except OSError:
+            return True
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def rewrite(self, hashes):
+        with self.locked(fcntl.LOCK_EX):
+            self.replace_file(hashes)
+
+    def replace_file(self, hashes):
+        # Callers hold the exclusive lock
+        self.close()
+        self.hashes = set(hashes)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(h + "\n" for h in self.hashes)
+        os.replace(tmp_path, self.path)
+        st = os.stat(self.path)
+        self.inode, self.offset = st.st_ino, st.st_size
+        self.line_count = len(self.hashes)
+
+def hashes_in_jsonl(jsonl_path):
+    return {event["event_hash"] for event in get_event_log(jsonl_path).read() if event.get("event_hash")}
+
+_jsonl_indexes = {}
+
+def get_jsonl_index(jsonl_path):
+    """
+    Returns the process-wide hash index for a segmented JSONL event log,
+    stored next to it as `<jsonl>.idx`. A missing sidecar is rebuilt from the
+    segments once; a missing log (e.g. after `make clean`) resets the index.
+    Hashes of segments dropped by retention stay in the index, so their
+    events are not written again.
+    """
+    exists = get_event_log(jsonl_path).exists()
+    index = _jsonl_indexes.get(jsonl_path)
+    if index is not None and exists:
+        return index
+
+    index_path = jsonl_path + ".idx"
+    index = HashIndex(index_path)
+    if not exists:
+        if len(index) or os.path.exists(index_path):
+            index.rewrite([])
+    elif not os.path.exists(index_path):
+        index.rewrite(hashes_in_jsonl(jsonl_path))
+
+    _jsonl_indexes[jsonl_path] = index
+    return index
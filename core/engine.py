@@ -0,0 +1,107 @@
+from collections import defaultdict
+from core.assembler import AuditEventAssembler, MULTI_RECORD_TYPES, record_type
+
+# Detectors registered under this key receive every non-audit (syslog) line.
+ANY_SYSLOG = "syslog"
+
+def record_key(line):
+    """
+    Returns the routing key of a log line in a single scan of its prefix:
+    the auditd record type (`type=USER_LOGIN ...` -> "USER_LOGIN") or, for
+    syslog lines, the program name (`... sshd[123]: ...` -> "sshd").
+    """
+    rtype = record_type(line)
+    if rtype:
+        return rtype
+
+    # "Jun  6 18:31:48 host sshd[123]: ..." or "2025-06-06T18:31:48+02:00 host sshd[123]: ..."
+    for token in line.split(None, 5)[:5]:
+        if token.endswith(":") and not token[:-1].isdigit():
+            return token[:-1].split("[", 1)[0]
+    return None
+
+class DetectionEngine:
+    """
+    Reads each line once, extracts its record key and hands it only to the
+    detectors registered for that key. Detectors keep their `detect(lines)`
+    signature and simply receive a pre-filtered list.
+
+    Modules exposing `detect_events(events)` instead receive complete auditd
+    events (SYSCALL + EXECVE + CWD + ... grouped by the assembler) whose
+    SYSCALL `key=` is listed in their AUDIT_KEYS.
+    """
+
+    def __init__(self):
+        self.detectors = []
+        self.routes = defaultdict(list)
+        self.syslog_routes = []
+        self.event_detectors = []
+        self.assembler = AuditEventAssembler()
+
+    def register(self, name, detect, record_types):
+        index = len(self.detectors)
+        self.detectors.append((name, detect))
+        for record_type in record_types:
+            if record_type == ANY_SYSLOG:
+                self.syslog_routes.append(index)
+            else:
+                self.routes[record_type].append(index)
+
+    def register_event_detector(self, name, detect_events, audit_keys):
+        self.event_detectors.append((name, detect_events, set(audit_keys)))
+
+    def register_module(self, name, module):
+        if hasattr(module, "detect_events"):
+            self.register_event_detector(name, module.detect_events, module.AUDIT_KEYS)
+        else:
+            self.register(name, module.detect, module.RECORD_TYPES)
+
+    def dispatch(self, lines, final=True, keys=None):
+        batches = [[] for _ in self.detectors]
+        audit_events = []
+        routes = self.routes
+        syslog_routes = self.syslog_routes
+        assembler = self.assembler if self.event_detectors else None
+        empty = ()
+
+        if keys is None:
+            keys = map(record_key, lines)
+
+        for key, line in zip(keys, lines):
+            for index in routes.get(key, empty):
+                batches[index].append(line)
+            if assembler and key in MULTI_RECORD_TYPES:
+                audit_events += assembler.feed(line, key)
+            if syslog_routes and not line.startswith(("type=", "node=")):
+                for index in syslog_routes:
+                    if index not in routes.get(key, empty):
+                        batches[index].append(line)
+
+        if assembler and final:
+            audit_events += assembler.flush()
+        return batches, audit_events
+
+    def run(self, lines, final=True, keys=None):
+        # With final=False, events still missing their EOE stay buffered in
+        # the assembler for the next call (streaming mode). `keys` can carry
+        # record keys already extracted by an earlier parsing stage.
+        batches, audit_events = self.dispatch(lines, final, keys)
+        events = []
+        for (name, detect), batch in zip(self.detectors, batches):
+            if batch:
+                events += detect(batch)
+        return events + self.run_event_detectors(audit_events)
+
+    def run_event_detectors(self, audit_events):
+        events = []
+        for name, detect_events, audit_keys in self.event_detectors:
+            matching = [e for e in audit_events if e["key"] in audit_keys]
+            if matching:
+                events += detect_events(matching)
+        return events
+
+    def expire(self, now):
+        # Streaming mode: emits buffered auditd events that never got an EOE
+        if not self.event_detectors:
+            return []
+        return self.run_event_detectors(self.assembler.flush_expired(now))
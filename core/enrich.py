@@ -0,0 +1,218 @@
+import os
+import pwd
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+PASSWD_PATH = "/etc/passwd"
+PASSWD_CHECK_INTERVAL = 1.0
+PROCESS_CACHE_SIZE = 4096
+PROCESS_TTL = 30.0
+# /proc/stat's btime has whole seconds and the clock may have been slewed since boot
+PROCESS_START_SLACK = 1.0
+UNSET_ID = 4294967295  # (uint32)-1, auditd's "no login uid"
+
+class UserCache:
+    """
+    uid -> username map bulk-loaded from /etc/passwd and reloaded when its
+    mtime changes (checked at most once per `check_interval`). Uids missing
+    from the file (LDAP/SSSD users) fall back to one NSS lookup each, whose
+    result, found or not, is kept until the next reload.
+    """
+
+    def __init__(self, passwd_path=PASSWD_PATH, check_interval=PASSWD_CHECK_INTERVAL):
+        self.passwd_path = passwd_path
+        self.check_interval = check_interval
+        self.users = {}
+        self.mtime = None
+        self.checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.lock = threading.Lock()
+
+    def load(self):
+        users = {}
+        try:
+            with open(self.passwd_path, "r", errors="replace") as f:
+                for line in f:
+                    fields = line.split(":")
+                    if len(fields) > 2 and fields[2].isdigit():
+                        users.setdefault(int(fields[2]), fields[0])
+        except OSError:
+            pass
+        self.users = users
+        self.reloads += 1
+
+    def check(self):
+        now = time.monotonic()
+        if self.mtime is not None and now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+        try:
+            mtime = os.stat(self.passwd_path).st_mtime_ns
+        except OSError:
+            mtime = 0
+        if mtime != self.mtime:
+            self.mtime = mtime
+            self.load()
+
+    def lookup(self, uid):
+        with self.lock:
+            self.check()
+            if uid in self.users:
+                self.hits += 1
+                return self.users[uid]
+            self.misses += 1
+            try:
+                name = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                name = None
+            self.users[uid] = name
+            return name
+
+    def username(self, uid):
+        # Same labels the detectors always used: "unknown" for an unset
+        # auid, "UID:<n>" when the uid cannot be resolved.
+        try:
+            uid = int(uid)
+        except (TypeError, ValueError):
+            return f"UID:{uid}"
+        if uid == UNSET_ID:
+            return "unknown"
+        return self.lookup(uid) or f"UID:{uid}"
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "reloads": self.reloads, "size": len(self.users)}
+
+class ProcessCache:
+    """
+    Bounded LRU of pid -> {exe, cmdline, ppid, started} snapshots read from
+    /proc. Entries expire after `ttl` seconds; pids that have already exited
+    are cached as None for the same period. The snapshot is taken when the
+    event is stored, not when it happened, so a lookup for an event time
+    rejects a process started after it: its pid was recycled since.
+    """
+
+    def __init__(self, max_size=PROCESS_CACHE_SIZE, ttl=PROCESS_TTL, proc_root="/proc"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.proc_root = proc_root
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.gone = 0
+        self.reused = 0
+        self.boot_time = None
+        self.lock = threading.Lock()
+
+    def booted(self):
+        # Seconds since the epoch at boot, which process start times count from
+        if self.boot_time is None:
+            try:
+                with open(os.path.join(self.proc_root, "stat"), "rb") as f:
+                    for line in f:
+                        if line.startswith(b"btime "):
+                            self.boot_time = int(line.split()[1])
+                            break
+            except (OSError, ValueError):
+                pass
+        return self.boot_time
+
+    def snapshot(self, pid):
+        base = os.path.join(self.proc_root, str(pid))
+        try:
+            with open(os.path.join(base, "stat"), "rb") as f:
+                stat = f.read()
+            with open(os.path.join(base, "cmdline"), "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            return None
+
+        # The comm field may contain spaces and parentheses; ppid follows
+        # the state field after the last ")", the start time (field 22, in
+        # clock ticks since boot) comes 19 fields after it
+        fields = stat[stat.rfind(b")") + 2:].split()
+        try:
+            exe = os.readlink(os.path.join(base, "exe"))
+        except OSError:
+            exe = None
+        boot_time = self.booted()
+        started = None
+        if boot_time is not None and len(fields) > 19:
+            started = round(boot_time + int(fields[19]) / os.sysconf("SC_CLK_TCK"), 2)
+        return {
+            "exe": exe,
+            "cmdline": cmdline.rstrip(b"\x00").replace(b"\x00", b" ").decode("utf-8", errors="replace"),
+            "ppid": int(fields[1]) if len(fields) > 1 else None,
+            "started": started,
+        }
+
+    def lookup(self, pid, at=None):
+        # `at`: the event's time (epoch seconds); None skips the start check
+        try:
+            pid = int(pid)
+        except (TypeError, ValueError):
+            return None
+
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(pid)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(pid)
+                self.hits += 1
+                return self.started_by(entry[0], at)
+
+        info = self.snapshot(pid)
+        with self.lock:
+            self.misses += 1
+            if info is None:
+                self.gone += 1
+            self.entries[pid] = (info, now + self.ttl)
+            self.entries.move_to_end(pid)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            return self.started_by(info, at)
+
+    def started_by(self, info, at):
+        if info is None or at is None or info["started"] is None:
+            return info
+        if info["started"] > at + PROCESS_START_SLACK:
+            self.reused += 1
+            return None
+        return info
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "gone": self.gone, "reused": self.reused,
+                "size": len(self.entries)}
+
+_users = UserCache()
+_processes = ProcessCache()
+
+def uid_to_user(uid):
+    return _users.username(uid)
+
+def process_info(pid, at=None):
+    return _processes.lookup(pid, at)
+
+def epoch(timestamp):
+    # Event timestamps are naive UTC ISO 8601
+    try:
+        return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def enrich_event(event):
+    # Attaches a /proc snapshot of the event's pid while it may still be
+    # running, unless that pid now belongs to a process started after the
+    # event. It goes under a top-level key, outside `extra`, so the event
+    # hash does not depend on whether the process was still alive.
+    if "process" not in event:
+        info = process_info(event.get("extra", {}).get("pid"), epoch(event.get("timestamp")))
+        if info:
+            event["process"] = info
+    return event
+
+def cache_stats():
+    return {"users": _users.stats(), "processes": _processes.stats()}
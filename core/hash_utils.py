@@ -2,8 +2,10 @@ import hashlib
 import json
 
 def generate_event_hash(event):
+    # The one event identity shared by SQLite, the JSONL log and the
+    # deleted-hash list: full timestamp, type, message and sorted extra.
     h = hashlib.sha256()
-    timestamp = event.get("timestamp", "")[:16]
+    timestamp = event.get("timestamp", "")
     content = f"{timestamp}|{event.get('event_type')}|{event.get('message')}|{json.dumps(event.get('extra', {}), sort_keys=True)}"
     h.update(content.encode("utf-8"))
     return h.hexdigest()
@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from datetime import datetime
+
+LOG_PATH = "output/debug_log.txt"
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 3
+BATCH_SIZE = 1000
+SUMMARY_INTERVAL = 10.0
+
+STOP = None
+
+class Formatter(logging.Formatter):
+    # The format debug_log.txt always had: [<iso timestamp>] [Noctilog] <message>
+    def __init__(self):
+        super().__init__("[%(asctime)s] [Noctilog] %(message)s")
+
+    def formatTime(self, record, datefmt=None):
+        return datetime.fromtimestamp(record.created).isoformat()
+
+    def format(self, record):
+        message = super().format(record)
+        if record.levelno >= logging.WARNING:
+            message = message.replace("[Noctilog] ", f"[Noctilog] {record.levelname}: ", 1)
+        return message
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    # Flushed once per batch by the writer thread instead of once per record
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+class BufferedWatchedFileHandler(logging.handlers.WatchedFileHandler):
+    # For the processes that do not rotate: reopens the file once another
+    # process has rotated it away
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+class BufferedStreamHandler(logging.StreamHandler):
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+class BackgroundWriter:
+    """
+    Takes log records off a queue in a daemon thread and hands them to the
+    file and console handlers, flushing once per batch: a burst of records
+    costs one write per handler, not one open/write/close per line. The
+    calling thread only formats the record and enqueues it.
+    """
+
+    def __init__(self, handlers, batch_size=BATCH_SIZE):
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for record in batch:
+                if record is STOP:
+                    continue
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        try:
+                            handler.handle(record)
+                        except Exception:
+                            handler.handleError(record)
+            for handler in self.handlers:
+                try:
+                    handler.flush_batch()
+                except Exception:
+                    pass
+            if STOP in batch:
+                return
+
+    def stop(self, timeout=2.0):
+        if self.thread.is_alive():
+            self.queue.put(STOP)
+            self.thread.join(timeout)
+        for handler in self.handlers:
+            handler.close()
+
+class Summaries:
+    """
+    Per-key counts of repetitive occurrences (duplicates skipped, deleted
+    events ignored, ...) reported as one INFO line per key at most every
+    `interval` seconds, or when `flush` is called at the end of a cycle.
+    """
+
+    def __init__(self, interval=SUMMARY_INTERVAL):
+        self.interval = interval
+        self.counts = {}
+        self.templates = {}
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, key, template, count=1):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + count
+            self.templates[key] = template
+            due = time.monotonic() - self.last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            self.last_flush = time.monotonic()
+        for key, count in counts.items():
+            if count:
+                logger.info(self.templates[key].format(count=f"{count:,}"))
+
+logger = logging.getLogger("noctilog")
+logger.propagate = False
+summaries = Summaries()
+_writer = None
+_settings = (None, True, False)
+_lock = threading.Lock()
+
+def configure(settings=None, console=True, rotate=False):
+    """
+    Sets up the background writer from the `logging` section of
+    config.yaml (level, file, max_mb, backups). `console` echoes records
+    to stdout; the dashboard turns it off. The log file is shared by every
+    entry point, so only the one that processes logs (`rotate`: main.py or
+    noctilogd, never both at once) rotates it; the others reopen it once it
+    has been rotated. Called again, it replaces the previous setup.
+    """
+    global _writer, _settings
+    _settings = (settings, console, rotate)
+    settings = settings or {}
+    level = getattr(logging, str(settings.get("level", "INFO")).upper(), logging.INFO)
+    path = settings.get("file", LOG_PATH)
+    max_bytes = int(settings.get("max_mb", MAX_BYTES / (1024 * 1024)) * 1024 * 1024)
+
+    handlers = []
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if rotate:
+            handlers.append(BufferedRotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=settings.get("backups", BACKUP_COUNT), encoding="utf-8"
+            ))
+        else:
+            handlers.append(BufferedWatchedFileHandler(path, encoding="utf-8"))
+    if console:
+        handlers.append(BufferedStreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(Formatter())
+        handler.setLevel(level)
+
+    with _lock:
+        previous, _writer = _writer, BackgroundWriter(handlers)
+        logger.handlers = [logging.handlers.QueueHandler(_writer.queue)]
+        logger.setLevel(level)
+    if previous:
+        previous.stop()
+
+def ensure_configured():
+    if _writer is None:
+        configure(*_settings)
+
+def shutdown():
+    summaries.flush()
+    if _writer:
+        _writer.stop()
+
+def reset_after_fork():
+    # The writer thread does not survive fork(): a child (backfill worker)
+    # starts its own on first use, with the parent's settings, and leaves
+    # rotating to the parent
+    global _writer, _settings
+    _writer = None
+    _settings = _settings[:2] + (False,)
+    logger.handlers = []
+
+atexit.register(shutdown)
+os.register_at_fork(after_in_child=reset_after_fork)
+
+def debug(message):
+    ensure_configured()
+    logger.debug(message)
+
+def info(message):
+    ensure_configured()
+    logger.info(message)
+
+def warning(message):
+    ensure_configured()
+    logger.warning(message)
+
+def error(message):
+    ensure_configured()
+    logger.error(message)
+
+def is_debug():
+    ensure_configured()
+    return logger.isEnabledFor(logging.DEBUG)
+
+def summarize(key, template, count=1):
+    # template is formatted with {count}, e.g. "{count} duplicate event(s) skipped"
+    ensure_configured()
+    summaries.add(key, template, count)
+
+def flush_summaries():
+    summaries.flush()
@@ -1,15 +1,60 @@
+import os
 import json
 import re
 from datetime import datetime
 from collections import defaultdict
+from core import log
+
+BLOCK_SIZE = 64 * 1024
+
+def find_tail_offset(f, tail_lines, block_size=BLOCK_SIZE):
+    # Walks backwards from EOF in fixed-size blocks and returns the byte
+    # offset where the last `tail_lines` lines start, without reading the
+    # rest of the file.
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    if tail_lines <= 0:
+        return pos
+
+    if pos:
+        f.seek(pos - 1)
+        if f.read(1) == b"\n":
+            pos -= 1
+
+    remaining = tail_lines
+    while pos > 0:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        block = f.read(step)
+        idx = len(block)
+        while True:
+            idx = block.rfind(b"\n", 0, idx)
+            if idx < 0:
+                break
+            remaining -= 1
+            if remaining == 0:
+                return pos + idx + 1
+    return 0
+
+def split_lines(data):
+    text = data.decode("utf-8", errors="replace")
+    if not text:
+        return []
+    lines = [line + "\n" for line in text.split("\n")]
+    if text.endswith("\n"):
+        lines.pop()
+    else:
+        lines[-1] = lines[-1][:-1]
+    return lines
 
 def read_logs(filepath, tail_lines=200):
     try:
-        with open(filepath, "r") as f:
-            lines = f.readlines()
-            return lines[-tail_lines:]
+        with open(filepath, "rb") as f:
+            f.seek(find_tail_offset(f, tail_lines))
+            return split_lines(f.read())
     except Exception as e:
-        print(f"[Log Reader Error] {e}")
+        log.error(f"[Log Reader] {e}")
         return []
 
 def append_jsonl(event, filepath):
@@ -17,7 +62,7 @@ def append_jsonl(event, filepath):
         with open(filepath, "a") as f:
             f.write(json.dumps(event) + "\n")
     except Exception as e:
-        print(f"[Append JSONL Error] {e}")
+        log.error(f"[Append JSONL] {e}")
 
 def read_logs_indexed(filepaths, tail_lines=200):
     logs_by_pid_ts = defaultdict(list)
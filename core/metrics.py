@@ -0,0 +1,231 @@
+import os
+import re
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEXTFILE_PATH = "output/metrics.prom"
+EXPORT_INTERVAL = 10
+
+# Seconds per call; audit bursts push the slow stages into the upper buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+SAMPLE_PATTERN = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)$')
+LABEL_PATTERN = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    def __init__(self, name, help_text, kind):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(key)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text, "counter")
+        self.values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text, "gauge")
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[label_key(labels)] = value
+
+class Histogram(Metric):
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, "histogram")
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = label_key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts, sum, count
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{format_labels(key, [('le', format_value(bound))])} {cumulative}")
+                lines.append(f"{self.name}_bucket{format_labels(key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{format_labels(key)} {format_value(total)}")
+                lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+LINES_READ = Counter("noctilog_lines_read_total", "Audit log lines read.")
+EVENTS_DETECTED = Counter("noctilog_events_detected_total", "Events produced by the detectors and threshold rules.")
+EVENTS_STORED = Counter("noctilog_events_stored_total", "New events written to the event log.")
+DUPLICATES = Counter("noctilog_duplicates_total", "Detected events already present in the event log.")
+DELETED_SKIPPED = Counter("noctilog_deleted_skipped_total", "Detected events dropped because they were deleted before.")
+COALESCED = Counter("noctilog_coalesced_total", "Events folded into the count of an open record.")
+ROWS_INSERTED = Counter("noctilog_db_rows_written_total", "Rows sent to SQLite, including ignored duplicates.")
+STAGE_SECONDS = Histogram("noctilog_stage_seconds", "Time per call spent in each processing stage.")
+QUEUE_DEPTH = Gauge("noctilog_queue_depth", "Items waiting in a pipeline queue.")
+QUEUE_CAPACITY = Gauge("noctilog_queue_capacity", "Size limit of a pipeline queue.")
+TAIL_LAG = Gauge("noctilog_tail_lag_bytes", "Bytes of a log file not read yet.")
+EXPORTED_AT = Gauge("noctilog_export_timestamp_seconds", "Unix time of the last metrics export.")
+
+METRICS = [
+    LINES_READ, EVENTS_DETECTED, EVENTS_STORED, DUPLICATES, DELETED_SKIPPED, COALESCED, ROWS_INSERTED,
+    STAGE_SECONDS, QUEUE_DEPTH, QUEUE_CAPACITY, TAIL_LAG, EXPORTED_AT,
+]
+
+# Stages shown, in order, in the dashboard summary
+SUMMARY_STAGES = ("read", "parse", "detect", "dedup", "db_insert", "jsonl_append", "render")
+
+@contextmanager
+def time_stage(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+def render():
+    EXPORTED_AT.set(round(time.time(), 3))
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+def write_textfile(path=TEXTFILE_PATH):
+    # Atomic replace, as node_exporter's textfile collector expects
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+def parse_text(text):
+    # {(name, ((label, value), ...)): value} for every sample line
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE_PATTERN.match(line.strip())
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        try:
+            samples[(name, label_key(dict(LABEL_PATTERN.findall(labels or ""))))] = float(value)
+        except ValueError:
+            continue
+    return samples
+
+def read_textfile(path=TEXTFILE_PATH):
+    try:
+        with open(path, "r") as f:
+            return parse_text(f.read())
+    except OSError:
+        return {}
+
+def samples():
+    return parse_text(render())
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def summary(samples):
+    """
+    One-line digest for the dashboard: mean latency per stage, the main
+    counters, reader lag (all log files) and the fullest pipeline queue.
+    """
+    def value(name, **labels):
+        return samples.get((name, label_key(labels)), 0)
+
+    stages = []
+    for stage in SUMMARY_STAGES:
+        count = value("noctilog_stage_seconds_count", stage=stage)
+        if count:
+            stages.append(f"{stage} {value('noctilog_stage_seconds_sum', stage=stage) / count * 1000:.1f}ms")
+
+    parts = [" · ".join(stages) or "no timings yet"]
+    parts.append(
+        f"{value('noctilog_lines_read_total'):.0f} lines, {value('noctilog_events_detected_total'):.0f} detected, "
+        f"{value('noctilog_events_stored_total'):.0f} stored, {value('noctilog_duplicates_total'):.0f} dup, "
+        f"{value('noctilog_deleted_skipped_total'):.0f} tombstoned"
+    )
+    depths = [
+        (size, samples.get(("noctilog_queue_capacity", key), 0))
+        for (name, key), size in samples.items() if name == "noctilog_queue_depth"
+    ]
+    lag = sum(size for (name, _), size in samples.items() if name == "noctilog_tail_lag_bytes")
+    lag = f"lag {format_bytes(lag)}"
+    if depths:
+        size, limit = max(depths)
+        lag += f", queue {size:.0f}/{limit:.0f}"
+    parts.append(lag)
+    return " | ".join(parts)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(listen):
+    """
+    Serves /metrics over HTTP on `listen` ("host:port") from a daemon
+    thread and returns the server.
+    """
+    host, _, port = listen.rpartition(":")
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
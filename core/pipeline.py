@@ -0,0 +1,408 @@
+import time
+import asyncio
+from collections import deque
+from main import (
+    build_sources,
+    get_aggregator,
+    get_coalescer,
+    maintain_event_logs,
+    unseen_events,
+    mark_coalesced,
+    load_deleted_hashes,
+    export_metrics,
+)
+from core import db, bus, metrics, log
+from core.engine import record_key
+from core.sources import StreamMerger, MERGE_DELAY
+from core.audisp import AudispSource, STDIN, RECONNECT_INTERVAL
+from core.dedup import get_jsonl_index
+from core.segments import get_event_log
+from core.hash_utils import generate_event_hash
+from core.enrich import enrich_event, cache_stats
+from core.watcher import FileWatcher
+
+QUEUE_SIZE = 64
+LINE_BATCH = 1000
+READ_BYTES = 1024 * 1024
+SINK_BATCH = 500
+SINK_INTERVAL = 0.5
+IDLE_TIMEOUT = 1.0
+MERGE_INTERVAL = 0.25
+STATS_INTERVAL = 60
+
+class Checkpoint:
+    # Travels behind the lines it covers; once the sinks have written
+    # everything before it, its source's tailer position can be committed.
+    # `watermark` is the timestamp of the last line covered, `streamed` the
+    # audit id of the last record an audisp feed delivered (the file offset
+    # does not move while the feed streams).
+    __slots__ = ("source", "position", "watermark", "streamed")
+
+    def __init__(self, source, position, watermark=None, streamed=None):
+        self.source = source
+        self.position = position
+        self.watermark = watermark
+        self.streamed = streamed
+
+class Tick:
+    # Sent while idle so buffered auditd events can expire
+    __slots__ = ("now",)
+
+    def __init__(self, now):
+        self.now = now
+
+STOP = object()
+
+class Pipeline:
+    """
+    For each configured log file: reader -> parser -> detector dispatch,
+    with that file's own tailer, watcher and detection engine. The
+    per-source event streams are merged on their timestamps (see
+    core.sources.StreamMerger), then run through the threshold rules,
+    enrichment and the sinks. Each stage is a task on one event loop,
+    connected by bounded queues. A full queue blocks the stage feeding it,
+    so a slow sink throttles reading instead of letting a burst of lines
+    pile up in memory; a source with a large backlog only fills its own
+    queues and reads one budget at a time, so the others keep flowing.
+    """
+
+    def __init__(self, config, sources=None, queue_size=QUEUE_SIZE):
+        self.config = config
+        self.queue_size = queue_size
+        if sources is None:
+            sources = build_sources(config, max_read_bytes=READ_BYTES, audisp=config.get("audisp"))
+        self.sources = sources
+        self.watchers = [FileWatcher(source.path) for source in self.sources]
+        self.aggregator = get_aggregator(config)
+        self.merge_delay = config.get("merge_delay", MERGE_DELAY)
+        self.jsonl_path = config["output"]["jsonl"]
+        self.event_log = get_event_log(self.jsonl_path, config.get("segments"))
+        self.conn = db.get_connection(config["output"]["db"])
+        self.writer = db.EventWriter(self.conn)
+        self.coalescer = get_coalescer(config)
+        self.counters = {"lines": 0, "events": 0, "deleted_skipped": 0, "coalesced": 0, "stored": 0, "duplicates": 0}
+        self.queues = {}
+
+    def queue_depths(self):
+        return {name: (queue.qsize(), queue.maxsize) for name, queue in self.queues.items()}
+
+    async def emit_lines(self, source, lines, out, streamed=None):
+        self.counters["lines"] += len(lines)
+        metrics.LINES_READ.inc(len(lines))
+        for start in range(0, len(lines), LINE_BATCH):
+            await out.put(lines[start:start + LINE_BATCH])
+        await out.put(Checkpoint(source, source.tailer.position(), source.line_time(lines[-1]), streamed))
+        await asyncio.sleep(0)
+
+    async def read_file(self, source, out):
+        # In a worker thread: a file on slow storage stalls only its own
+        # reader. False once nothing moved; a read that only skipped records
+        # the audisp feed had delivered still commits the skipped bytes.
+        position = source.tailer.position()
+        with metrics.time_stage("read"):
+            lines = await asyncio.get_running_loop().run_in_executor(None, source.read)
+        if lines:
+            await self.emit_lines(source, lines, out)
+            return True
+        if source.tailer.position() == position:
+            return False
+        await out.put(Checkpoint(source, source.tailer.position()))
+        return True
+
+    async def follow_feed(self, source, stream, out):
+        # Records from auditd's dispatcher until the feed ends (True) or the
+        # pipeline stops (False). The file offset stays where the feed took
+        # over; the checkpoints carry the last streamed audit id instead.
+        source.streaming = True
+        try:
+            while not self.stopping.is_set():
+                lines = await stream.read(IDLE_TIMEOUT)
+                if lines is None:
+                    return True
+                if not lines:
+                    await out.put(Tick(time.time()))
+                    continue
+                lines = source.unseen(lines)
+                if lines:
+                    await self.emit_lines(source, lines, out, source.last_streamed)
+            return False
+        finally:
+            stream.close()
+
+    async def reader(self, index, out):
+        source = self.sources[index]
+        watcher = self.watchers[index]
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        if watcher.fd is not None:
+            loop.add_reader(watcher.fd, lambda: (watcher.drain(), changed.set()))
+        reconnect_at = 0.0
+
+        while not self.stopping.is_set():
+            if isinstance(source, AudispSource) and time.monotonic() >= reconnect_at:
+                stream = await source.connect()
+                if stream is not None:
+                    # The feed only carries new records: catch up on the file first
+                    while not self.stopping.is_set() and await self.read_file(source, out):
+                        pass
+                    if not await self.follow_feed(source, stream, out):
+                        continue
+                    if source.mode == STDIN:
+                        # A plugin is done once auditd closes its stdin
+                        log.info("audisp closed noctilogd's stdin; stopping.")
+                        self.stop()
+                        continue
+                    source.feed_closed()
+                reconnect_at = time.monotonic() + RECONNECT_INTERVAL
+
+            if await self.read_file(source, out):
+                continue
+
+            await out.put(Tick(time.time()))
+            changed.clear()
+            waiters = [asyncio.ensure_future(changed.wait()), asyncio.ensure_future(self.stopping.wait())]
+            timeout = IDLE_TIMEOUT if watcher.fd is not None else watcher.poll_interval
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+
+        if watcher.fd is not None:
+            loop.remove_reader(watcher.fd)
+        await out.put(STOP)
+
+    async def parser(self, inbox, out):
+        while True:
+            item = await inbox.get()
+            if isinstance(item, list):
+                with metrics.time_stage("parse"):
+                    item = ([record_key(line) for line in item], item)
+            await out.put(item)
+            if item is STOP:
+                return
+
+    async def detector(self, index, inbox, out):
+        # Tags everything with the source index for the merger
+        source = self.sources[index]
+        assembler = source.engine.assembler
+        held = deque()
+        while True:
+            item = await inbox.get()
+            with metrics.time_stage("detect"):
+                if isinstance(item, tuple):
+                    keys, lines = item
+                    events = source.detect(lines, final=False, keys=keys)
+                elif isinstance(item, Tick):
+                    events = source.expire(item.now)
+                elif item is STOP:
+                    events = source.detect([], final=True)
+                else:
+                    events = []
+
+            if events:
+                await out.put((index, events))
+            if isinstance(item, Checkpoint):
+                held.append((assembler.opened, item))
+            # A checkpoint waits for the auditd events opened before it: its
+            # offset is past their first records, which must not be skipped
+            # on a restart while those events are still being assembled
+            oldest = assembler.oldest_open()
+            while held and (oldest is None or oldest >= held[0][0]):
+                await out.put((index, held.popleft()[1]))
+            if not isinstance(item, (tuple, Checkpoint)):
+                await out.put((index, item))
+            if item is STOP:
+                return
+
+    async def merger(self, inbox, out):
+        merger = StreamMerger(len(self.sources), self.merge_delay)
+        running = len(self.sources)
+        while True:
+            timeout = MERGE_INTERVAL if len(merger) else None
+            try:
+                index, item = await asyncio.wait_for(inbox.get(), timeout)
+            except asyncio.TimeoutError:
+                index, item = None, None
+
+            if isinstance(item, list):
+                merger.add(index, item, time.monotonic())
+            elif isinstance(item, Checkpoint):
+                merger.checkpoint(index, item, item.watermark)
+            elif isinstance(item, Tick):
+                merger.set_idle(index)
+            elif item is STOP:
+                merger.set_idle(index)
+                running -= 1
+
+            with metrics.time_stage("merge"):
+                events, checkpoints = merger.release(time.monotonic())
+                if events:
+                    events += self.aggregator.process(events)
+            if events:
+                self.counters["events"] += len(events)
+                metrics.EVENTS_DETECTED.inc(len(events))
+                await out.put(events)
+            for checkpoint in checkpoints:
+                await out.put(checkpoint)
+            if not running:
+                await out.put(STOP)
+                return
+
+    async def enricher(self, inbox, out):
+        while True:
+            item = await inbox.get()
+            if isinstance(item, list):
+                kept = []
+                with metrics.time_stage("dedup"):
+                    deleted_hashes = load_deleted_hashes()
+                    for event in item:
+                        event["event_hash"] = generate_event_hash(event)
+                        if event["event_hash"] in deleted_hashes:
+                            self.counters["deleted_skipped"] += 1
+                            metrics.DELETED_SKIPPED.inc()
+                            continue
+                        kept.append(enrich_event(event))
+                if not kept:
+                    continue
+                item = kept
+            await out.put(item)
+            if item is STOP:
+                return
+
+    def write_batch(self, events):
+        # Runs in a worker thread: one SQLite transaction and one JSONL
+        # write per batch. Repeats of an open record only bump its count.
+        # Events stored before are dropped first, so they are not coalesced
+        # (counted) again.
+        index = get_jsonl_index(self.jsonl_path)
+        fresh = unseen_events(index, events)
+        records, merges = self.coalescer.process(fresh)
+        for event in records:
+            self.writer.add(event)
+        self.writer.flush()
+
+        stored = records
+        if records:
+            try:
+                with metrics.time_stage("jsonl_append"):
+                    self.event_log.append(records)
+            except Exception as e:
+                # Not in the event log: not reported as stored or published
+                log.error(f"Failed to write events to JSONL: {e}")
+                stored = []
+            for event in stored:
+                index.add(event["event_hash"])
+        if merges:
+            db.merge_counts(self.conn, merges)
+        if len(records) < len(fresh):
+            mark_coalesced(index, fresh)
+        return stored, len(fresh) - len(records), len(events) - len(fresh)
+
+    async def flush(self, batch):
+        if not batch:
+            return
+        loop = asyncio.get_running_loop()
+        new_events, coalesced, duplicates = await loop.run_in_executor(None, self.write_batch, batch)
+        self.counters["stored"] += len(new_events)
+        self.counters["coalesced"] += coalesced
+        self.counters["duplicates"] += duplicates
+        metrics.EVENTS_STORED.inc(len(new_events))
+        metrics.COALESCED.inc(coalesced)
+        metrics.DUPLICATES.inc(duplicates)
+        if new_events:
+            bus.publish(bus.EVENTS_INSERTED, new_events)
+
+    async def sinks(self, inbox):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = await asyncio.wait_for(inbox.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+
+            if isinstance(item, list):
+                if not batch:
+                    deadline = time.monotonic() + SINK_INTERVAL
+                batch += item
+                if len(batch) < SINK_BATCH:
+                    continue
+
+            await self.flush(batch)
+            batch, deadline = [], None
+
+            if isinstance(item, Checkpoint):
+                item.source.tailer.commit(item.position)
+                if item.streamed:
+                    item.source.commit_streamed(item.streamed)
+            elif item is STOP:
+                return
+
+    async def report(self):
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), STATS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            depths = ", ".join(f"{name}={size}/{limit}" for name, (size, limit) in self.queue_depths().items())
+            log.info(f"Pipeline queues: {depths}; counters: {self.counters}; caches: {cache_stats()}")
+            log.flush_summaries()
+            if not self.stopping.is_set():
+                await asyncio.get_running_loop().run_in_executor(None, maintain_event_logs, self.config)
+
+    def update_gauges(self):
+        for name, (size, limit) in self.queue_depths().items():
+            metrics.QUEUE_DEPTH.set(size, queue=name)
+            metrics.QUEUE_CAPACITY.set(limit, queue=name)
+        for source in self.sources:
+            metrics.TAIL_LAG.set(source.lag(), source=source.path)
+
+    async def export(self):
+        settings = self.config.get("metrics") or {}
+        interval = settings.get("interval", metrics.EXPORT_INTERVAL)
+        while True:
+            self.update_gauges()
+            await asyncio.get_running_loop().run_in_executor(None, export_metrics, self.config)
+            if self.stopping.is_set():
+                return
+            try:
+                await asyncio.wait_for(self.stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        self.stopping = asyncio.Event()
+        self.queues = {}
+        for name in ("events", "merged", "enriched"):
+            self.queues[name] = asyncio.Queue(self.queue_size)
+        q = self.queues
+        stages = []
+        for index, source in enumerate(self.sources):
+            lines, parsed = asyncio.Queue(self.queue_size), asyncio.Queue(self.queue_size)
+            self.queues[f"lines:{source.name}"] = lines
+            self.queues[f"parsed:{source.name}"] = parsed
+            stages += [
+                self.reader(index, lines),
+                self.parser(lines, parsed),
+                self.detector(index, parsed, q["events"]),
+            ]
+        stages += [
+            self.merger(q["events"], q["merged"]),
+            self.enricher(q["merged"], q["enriched"]),
+            self.sinks(q["enriched"]),
+        ]
+        reporter = asyncio.ensure_future(self.report())
+        exporter = asyncio.ensure_future(self.export())
+        modes = ", ".join(f"{source.path} ({watcher.mode})" for source, watcher in zip(self.sources, self.watchers))
+        log.info(f"Pipeline started following {modes}.")
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            self.stopping.set()
+            await reporter
+            await exporter
+            for watcher in self.watchers:
+                watcher.close()
+
+    def stop(self):
+        self.stopping.set()
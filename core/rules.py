@@ -0,0 +1,159 @@
+import re
+import yaml
+from datetime import datetime
+from models.event import create_event
+from core.auditd import parse_record
+from core.assembler import record_type
+from core.enrich import uid_to_user
+
+RULES_PATH = "config/rules.yaml"
+MISSING = "N/A"
+RULE_KEYS = {"name", "record_type", "match", "regex", "event_type", "severity", "message", "fields", "source"}
+
+# Applied to an extracted value with `{field: auid, transform: username}`
+TRANSFORMS = {
+    "username": uid_to_user,
+    "lower": lambda value: value.lower() if isinstance(value, str) else value,
+}
+
+class FieldValues(dict):
+    # Message template lookups: extracted fields first, then any record field
+    def __init__(self, extra, record):
+        super().__init__(extra)
+        self.record = record
+
+    def __missing__(self, key):
+        return self.record.get(key, MISSING)
+
+class Rule:
+    """
+    One declarative detection: a record type, field values the record must
+    have (`match`, a value or a list of accepted values per field; `regex`
+    for patterns), the fields copied into `extra`, and the event's type,
+    severity and message template.
+    """
+
+    def __init__(self, name, record_type, event_type, message, match=None, regex=None, fields=None,
+                 severity="medium", source="audit.log"):
+        self.name = name
+        self.record_types = [record_type] if isinstance(record_type, str) else list(record_type)
+        self.event_type = event_type
+        self.message = message
+        self.severity = severity
+        self.source = source
+        self.match = {
+            key: {str(v) for v in values} if isinstance(values, list) else {str(values)}
+            for key, values in (match or {}).items()
+        }
+        self.regex = {key: re.compile(pattern) for key, pattern in (regex or {}).items()}
+        self.fields = []
+        for out, spec in (fields or {}).items():
+            if isinstance(spec, str):
+                spec = {"field": spec}
+            transform = spec.get("transform")
+            if transform and transform not in TRANSFORMS:
+                raise ValueError(f"rule {name}: unknown transform {transform!r}")
+            self.fields.append((out, spec.get("field", out), TRANSFORMS.get(transform), spec.get("default", MISSING)))
+
+    @classmethod
+    def from_dict(cls, spec):
+        unknown = set(spec) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"rule {spec.get('name', '?')}: unknown key(s) {', '.join(sorted(unknown))}")
+        return cls(**spec)
+
+    def matches(self, record):
+        for key, values in self.match.items():
+            if record.get(key) not in values:
+                return False
+        for key, pattern in self.regex.items():
+            value = record.get(key)
+            if value is None or not pattern.search(value):
+                return False
+        return True
+
+    def build_event(self, record):
+        extra = {}
+        for out, field, transform, default in self.fields:
+            value = record.get(field, default)
+            extra[out] = transform(value) if transform else value
+        return create_event(
+            event_type=self.event_type,
+            message=self.message.format_map(FieldValues(extra, record)),
+            source=self.source,
+            severity=self.severity,
+            timestamp=datetime.utcfromtimestamp(record.timestamp).isoformat(),
+            extra=extra
+        )
+
+class RuleSet:
+    """
+    Rules compiled into one matcher: an index by record type and, per type,
+    a hash index on one required `field=value` of each rule, the field
+    whose values vary most between that type's rules. A line is read once:
+    its type picks the index, the values of the (few) indexed fields are
+    looked up, and only the rules found there are evaluated in full. The
+    cost per line depends on the number of distinct indexed fields, not on
+    the number of rules.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.by_type = {}
+        for rule in rules:
+            for rtype in rule.record_types:
+                self.by_type.setdefault(rtype, []).append(rule)
+
+        # record type -> ({field: {value: [rules]}}, rules without a match field)
+        self.indexes = {}
+        for rtype, type_rules in self.by_type.items():
+            distinct = {}
+            for rule in type_rules:
+                for key, values in rule.match.items():
+                    distinct.setdefault(key, set()).update(values)
+            fields, unindexed = {}, []
+            for rule in type_rules:
+                if not rule.match:
+                    unindexed.append(rule)
+                    continue
+                key = max(rule.match, key=lambda k: len(distinct[k]))
+                for value in rule.match[key]:
+                    fields.setdefault(key, {}).setdefault(value, []).append(rule)
+            self.indexes[rtype] = (fields, unindexed)
+
+    @property
+    def record_types(self):
+        return tuple(self.by_type)
+
+    def candidates(self, record):
+        index = self.indexes.get(record.type)
+        if index is None:
+            return ()
+        fields, unindexed = index
+        rules = list(unindexed)
+        for key, by_value in fields.items():
+            found = by_value.get(record.get(key))
+            if found:
+                rules += found
+        return rules
+
+    def detect(self, lines):
+        events = []
+        indexes = self.indexes
+        for line in lines:
+            if record_type(line) not in indexes:
+                continue
+            record = parse_record(line)
+            if record is None:
+                continue
+            for rule in self.candidates(record):
+                if rule.matches(record):
+                    events.append(rule.build_event(record))
+        return events
+
+def load_rules(path=RULES_PATH):
+    with open(path, "r") as f:
+        specs = yaml.safe_load(f) or []
+    if isinstance(specs, dict):
+        specs = specs.get("rules") or []
+    return RuleSet([Rule.from_dict(spec) for spec in specs])
@@ -0,0 +1,220 @@
+import os
+import gzip
+import json
+import fcntl
+import shutil
+import threading
+from datetime import date, datetime
+
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+MANIFEST_NAME = "manifest.json"
+UNKNOWN_DAY = "unknown"
+
+def event_day(event):
+    timestamp = event.get("timestamp") or ""
+    return timestamp[:10] if len(timestamp) >= 10 and timestamp[4] == "-" else UNKNOWN_DAY
+
+class SegmentedLog:
+    """
+    A JSONL event log split into rolling segments: `output/events.jsonl`
+    becomes `output/events/events-<yyyymmdd>-<part>.jsonl`, one series per
+    event day, rolled over every `max_bytes`. `manifest.json` lists each
+    segment's day, first/last timestamp, event count and size, so `read` only
+    opens segments overlapping the requested time range.
+
+    `maintain` gzips segments older than `compress_after_days` and deletes
+    those older than `retention_days` (either can be None to disable). A
+    pre-existing single-file log is moved in as a legacy segment on first use.
+    Writers in other processes (daemon, backfill, dashboard) are serialized
+    with an flock on the manifest.
+    """
+
+    def __init__(self, path, max_bytes=SEGMENT_MAX_BYTES, compress_after_days=None, retention_days=None):
+        self.path = path
+        self.directory = os.path.splitext(path)[0]
+        self.prefix = os.path.basename(self.directory)
+        self.manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        self.max_bytes = max_bytes
+        self.compress_after_days = compress_after_days
+        self.retention_days = retention_days
+        self.segments = []
+        self.manifest_mtime = None
+        self.lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.manifest_path) or os.path.isfile(self.path)
+
+    def locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(self.manifest_path + ".lock", "a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def load_manifest(self):
+        # Re-read only when another process rewrote it
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            self.segments, self.manifest_mtime = [], None
+            return
+        if mtime != self.manifest_mtime:
+            with open(self.manifest_path, "r") as f:
+                self.segments = json.load(f)["segments"]
+            self.manifest_mtime = mtime
+
+    def save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segments": self.segments}, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+        self.manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def import_legacy(self):
+        if not os.path.isfile(self.path):
+            return
+        segment = {"name": None, "day": UNKNOWN_DAY, "first": None, "last": None, "count": 0, "bytes": 0, "compressed": False}
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    timestamp = json.loads(line).get("timestamp")
+                except ValueError:
+                    continue
+                self.track(segment, timestamp)
+        segment["name"] = f"{self.prefix}-legacy-{len(self.segments):03d}.jsonl"
+        segment["bytes"] = os.path.getsize(self.path)
+        if segment["last"]:
+            segment["day"] = segment["last"][:10]
+        shutil.move(self.path, os.path.join(self.directory, segment["name"]))
+        self.segments.append(segment)
+        self.save_manifest()
+
+    @staticmethod
+    def track(segment, timestamp):
+        segment["count"] += 1
+        if timestamp:
+            if segment["first"] is None or timestamp < segment["first"]:
+                segment["first"] = timestamp
+            if segment["last"] is None or timestamp > segment["last"]:
+                segment["last"] = timestamp
+
+    def segment_for(self, day):
+        for segment in reversed(self.segments):
+            if segment["day"] == day and not segment["compressed"] and segment["bytes"] < self.max_bytes:
+                if segment["name"].startswith(self.prefix + "-legacy"):
+                    continue
+                return segment
+        part = sum(1 for segment in self.segments if segment["day"] == day)
+        segment = {
+            "name": f"{self.prefix}-{day.replace('-', '')}-{part:03d}.jsonl",
+            "day": day, "first": None, "last": None, "count": 0, "bytes": 0, "compressed": False,
+        }
+        self.segments.append(segment)
+        return segment
+
+    def append(self, events):
+        if not events:
+            return
+        by_day = {}
+        for event in events:
+            by_day.setdefault(event_day(event), []).append(event)
+
+        with self.lock, self.locked():
+            self.load_manifest()
+            self.import_legacy()
+            for day, day_events in by_day.items():
+                segment = self.segment_for(day)
+                data = "".join(json.dumps(event) + "\n" for event in day_events).encode("utf-8")
+                with open(os.path.join(self.directory, segment["name"]), "ab") as f:
+                    f.write(data)
+                segment["bytes"] += len(data)
+                for event in day_events:
+                    self.track(segment, event.get("timestamp"))
+            self.save_manifest()
+
+    def open_segment(self, segment):
+        path = os.path.join(self.directory, segment["name"])
+        return gzip.open(path, "rt") if segment["compressed"] else open(path, "r")
+
+    def read(self, start=None, end=None):
+        # Yields events with start <= timestamp <= end (ISO strings),
+        # skipping segments whose manifest range lies outside it
+        with self.lock, self.locked():
+            self.load_manifest()
+            self.import_legacy()
+            segments = list(self.segments)
+
+        for segment in segments:
+            if start and segment["last"] and segment["last"] < start:
+                continue
+            if end and segment["first"] and segment["first"] > end:
+                continue
+            try:
+                with self.open_segment(segment) as f:
+                    for line in f:
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            continue
+                        timestamp = event.get("timestamp") or ""
+                        if (start and timestamp < start) or (end and timestamp > end):
+                            continue
+                        yield event
+            except OSError:
+                continue
+
+    def maintain(self, today=None):
+        # Returns (compressed, removed) segment counts
+        if not (self.compress_after_days or self.retention_days) or not self.exists():
+            return 0, 0
+        today = today or date.today()
+        compressed = removed = 0
+
+        with self.lock, self.locked():
+            self.load_manifest()
+            self.import_legacy()
+            kept = []
+            for segment in self.segments:
+                try:
+                    age = (today - datetime.strptime(segment["day"], "%Y-%m-%d").date()).days
+                except ValueError:
+                    kept.append(segment)
+                    continue
+
+                path = os.path.join(self.directory, segment["name"])
+                if self.retention_days and age > self.retention_days:
+                    if os.path.exists(path):
+                        os.remove(path)
+                    removed += 1
+                    continue
+                if self.compress_after_days and age > self.compress_after_days and not segment["compressed"]:
+                    with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.replace(path + ".gz.tmp", path + ".gz")
+                    os.remove(path)
+                    segment["name"] += ".gz"
+                    segment["bytes"] = os.path.getsize(path + ".gz")
+                    segment["compressed"] = True
+                    compressed += 1
+                kept.append(segment)
+
+            if compressed or removed:
+                self.segments = kept
+                self.save_manifest()
+        return compressed, removed
+
+_logs = {}
+
+def get_event_log(path, settings=None):
+    """
+    Returns the process-wide SegmentedLog for `path`. `settings` is the
+    `segments` section of config.yaml (max_mb, compress_after_days,
+    retention_days) and, when given, replaces the log's current policy.
+    """
+    log = _logs.get(path)
+    if log is None:
+        log = _logs[path] = SegmentedLog(path)
+    if settings:
+        log.max_bytes = int(settings.get("max_mb", SEGMENT_MAX_BYTES // (1024 * 1024)) * 1024 * 1024)
+        log.compress_after_days = settings.get("compress_after_days")
+        log.retention_days = settings.get("retention_days")
+    return log
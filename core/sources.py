@@ -0,0 +1,247 @@
+import os
+import re
+import heapq
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from core import log, syslog
+from core.tailer import LogTailer, MAX_READ_BYTES
+from core.assembler import open_events_start
+
+AUDITD = "auditd"
+SYSLOG = "syslog"
+FORMATS = (AUDITD, SYSLOG)
+SOURCE_KEYS = {"path", "format", "detectors"}
+
+OFFSETS_DIR = "output/offsets"
+MERGE_DELAY = 2.0
+
+AUDIT_STAMP = re.compile(r"audit\((\d+(?:\.\d+)?):")
+LATEST = "\U0010ffff"
+
+def event_time(event):
+    return event.get("timestamp") or ""
+
+def line_time(line, fmt):
+    # Timestamp of a raw line in the form events carry (naive UTC ISO 8601)
+    if fmt == AUDITD:
+        match = AUDIT_STAMP.search(line)
+        ts = float(match.group(1)) if match else None
+    else:
+        ts = syslog.parse_timestamp(line)
+    return None if ts is None else datetime.utcfromtimestamp(ts).isoformat()
+
+def sniff_format(path):
+    # First non-empty line decides; a file that can't be read yet goes by its name
+    try:
+        with open(path, "r", errors="replace") as f:
+            for line in f:
+                if line.strip():
+                    return AUDITD if line.startswith(("type=", "node=")) else SYSLOG
+    except OSError:
+        pass
+    return AUDITD if "audit" in os.path.basename(path) else SYSLOG
+
+def parse_log_files(entries):
+    """
+    Normalizes the `log_files` list of config.yaml into dicts with `path`,
+    `format` and `detectors`. An entry is a path or a mapping with those
+    keys; a missing format is sniffed from the file, missing detectors
+    (None) mean the modules enabled for that format.
+    """
+    specs = []
+    seen = set()
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        unknown = set(entry) - SOURCE_KEYS
+        if unknown:
+            raise ValueError(f"log_files: {entry.get('path', '?')}: unknown key(s) {', '.join(sorted(unknown))}")
+        path = entry.get("path")
+        if not path:
+            raise ValueError("log_files: entry without a path")
+        if path in seen:
+            log.warning(f"log_files: {path} listed twice, ignoring the second entry.")
+            continue
+        fmt = entry.get("format") or sniff_format(path)
+        if fmt not in FORMATS:
+            raise ValueError(f"log_files: {path}: unknown format {fmt!r} (expected {' or '.join(FORMATS)})")
+        seen.add(path)
+        specs.append({"path": path, "format": fmt, "detectors": entry.get("detectors")})
+    return specs
+
+def offset_path(path):
+    # /var/log/auth.log -> output/offsets/var_log_auth.log.txt
+    return os.path.join(OFFSETS_DIR, path.strip("/").replace("/", "_") + ".txt")
+
+class Source:
+    """
+    One configured log file: the format of its lines, the detection engine
+    for that format and a tailer with its own offset file. Sources are read
+    and run through their detectors independently; their events only meet
+    in the timestamp merge.
+    """
+
+    def __init__(self, path, fmt, engine, offset_path, tail_lines=200, max_read_bytes=MAX_READ_BYTES):
+        self.path = path
+        self.format = fmt
+        self.engine = engine
+        self.name = os.path.basename(path)
+        self.tailer = LogTailer(path, offset_path, tail_lines=tail_lines, max_read_bytes=max_read_bytes)
+
+    def read(self):
+        # A file that does not exist (yet) reads as empty until it appears
+        try:
+            return self.tailer.read_new_lines()
+        except FileNotFoundError:
+            return []
+
+    def hold_open_events(self, lines, position):
+        """
+        One-shot runs flush the assembler at the end of each read. The
+        records of auditd events still being written are left for the next
+        read instead: returns the lines before them and the position of
+        their first byte, and moves the tailer back there.
+        """
+        if self.format != AUDITD or not self.engine.event_detectors or not lines:
+            return lines, position
+        cut = open_events_start(lines)
+        if cut == len(lines):
+            return lines, position
+        inode, offset = position
+        held = sum(len(line.encode("utf-8")) for line in lines[cut:])
+        # Nothing to gain when the open events fill the whole read budget,
+        # or when they began in the file rotated away before this read
+        if held > offset or held >= self.tailer.max_read_bytes:
+            return lines, position
+        if self.tailer.position() == position:
+            self.tailer.rewind(offset - held)
+        return lines[:cut], (inode, offset - held)
+
+    def detect(self, lines, final=True, keys=None):
+        events = self.engine.run(lines, final=final, keys=keys)
+        events.sort(key=event_time)
+        return events
+
+    def expire(self, now):
+        events = self.engine.expire(now)
+        events.sort(key=event_time)
+        return events
+
+    def line_time(self, line):
+        return line_time(line, self.format)
+
+    def lag(self):
+        # Bytes appended that the tailer has not reached; the whole file
+        # once it was rotated away from under the tailer
+        inode, offset = self.tailer.position()
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return 0
+        return max(st.st_size - offset, 0) if st.st_ino == inode else st.st_size
+
+def read_one(source):
+    try:
+        lines = source.read()
+    except Exception as e:
+        log.error(f"Error reading {source.path}: {e}")
+        lines = []
+    return source, lines, source.tailer.position()
+
+def read_all(sources):
+    """
+    Reads every source in its own thread and returns (source, lines,
+    position) per source, in configuration order. Each read stops at the
+    tailer's byte budget, so a large backlog in one file holds the others
+    up by at most one budget per cycle; the rest is read next cycle.
+    """
+    if len(sources) <= 1:
+        return [read_one(source) for source in sources]
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="source") as pool:
+        return list(pool.map(read_one, sources))
+
+def merge_events(streams):
+    # k-way merge of per-source event lists, each already in timestamp order
+    return list(heapq.merge(*streams, key=event_time))
+
+class StreamMerger:
+    """
+    Streaming k-way merge of the event streams of several sources on their
+    timestamps. Events wait in a heap until every source that is still
+    reading has moved past them (its watermark: the newest line or event
+    timestamp seen), so threshold rules and alerts see one ordered stream.
+    A source that is caught up or finished holds nothing back, and no event
+    waits longer than `max_delay` seconds: a stalled source delays the
+    others by that much at most, later events of it are merged as they come.
+
+    A checkpoint is released once every event its source sent before it
+    has left the heap, so an offset is never committed ahead of events that
+    are still buffered.
+    """
+
+    def __init__(self, count, max_delay=MERGE_DELAY):
+        self.max_delay = max_delay
+        self.heap = []
+        self.seq = 0
+        self.watermarks = [""] * count
+        self.idle = [False] * count
+        self.arrivals = deque()
+        # Per source: seqs of its events still in the heap, in arrival
+        # order, and (seq, checkpoint) pairs waiting for them
+        self.pending = [deque() for _ in range(count)]
+        self.checkpoints = [deque() for _ in range(count)]
+        self.released = set()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, source, events, now):
+        if not events:
+            return
+        pending = self.pending[source]
+        newest = self.watermarks[source]
+        for event in events:
+            ts = event_time(event)
+            heapq.heappush(self.heap, (ts, self.seq, source, event))
+            pending.append(self.seq)
+            self.seq += 1
+            if ts > newest:
+                newest = ts
+        self.watermarks[source] = newest
+        self.arrivals.append((now, newest))
+        self.idle[source] = False
+
+    def checkpoint(self, source, checkpoint, watermark=None):
+        if watermark and watermark > self.watermarks[source]:
+            self.watermarks[source] = watermark
+        self.checkpoints[source].append((self.seq, checkpoint))
+        self.idle[source] = False
+
+    def set_idle(self, source):
+        self.idle[source] = True
+
+    def release(self, now):
+        """
+        Returns the events that can leave the heap, in timestamp order, and
+        the checkpoints that became safe to commit.
+        """
+        reading = [mark for mark, idle in zip(self.watermarks, self.idle) if not idle]
+        horizon = min(reading) if reading else LATEST
+        while self.arrivals and now - self.arrivals[0][0] >= self.max_delay:
+            horizon = max(horizon, self.arrivals.popleft()[1])
+
+        events = []
+        heap = self.heap
+        while heap and heap[0][0] <= horizon:
+            _, seq, _, event = heapq.heappop(heap)
+            events.append(event)
+            self.released.add(seq)
+
+        checkpoints = []
+        for pending, waiting in zip(self.pending, self.checkpoints):
+            while pending and pending[0] in self.released:
+                self.released.discard(pending.popleft())
+            while waiting and (not pending or pending[0] >= waiting[0][0]):
+                checkpoints.append(waiting.popleft()[1])
+        return events, checkpoints
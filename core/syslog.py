@@ -0,0 +1,50 @@
+import re
+import time
+from datetime import datetime
+
+# "Jun  6 18:31:48 host sshd[123]: ..." (RFC 3164: local time, no year)
+BSD_TIMESTAMP = re.compile(r"([A-Z][a-z]{2}) +(\d{1,2}) (\d{2}):(\d{2}):(\d{2})")
+MONTHS = {
+    name: number for number, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1
+    )
+}
+FUTURE_SLACK = 86400
+
+def parse_timestamp(line, now=None):
+    """
+    Returns the Unix time of a syslog line, or None when it does not start
+    with a timestamp. Both rsyslog formats are read: RFC 3339
+    ("2025-06-06T18:31:48.123456+02:00") and the traditional
+    "Jun  6 18:31:48" in local time. The latter carries no year: the
+    current one is assumed, or the previous one when that would put the
+    line more than a day in the future (December lines read in January).
+    """
+    if line[:4].isdigit():
+        try:
+            return datetime.fromisoformat(line.split(None, 1)[0]).timestamp()
+        except ValueError:
+            return None
+
+    match = BSD_TIMESTAMP.match(line)
+    if not match:
+        return None
+    month = MONTHS.get(match.group(1))
+    if month is None:
+        return None
+    day, hour, minute, second = (int(value) for value in match.group(2, 3, 4, 5))
+    now = time.time() if now is None else now
+    year = time.localtime(now).tm_year
+    try:
+        ts = time.mktime((year, month, day, hour, minute, second, 0, 0, -1))
+        if ts > now + FUTURE_SLACK:
+            ts = time.mktime((year - 1, month, day, hour, minute, second, 0, 0, -1))
+    except (OverflowError, ValueError):
+        return None
+    return ts
+
+def event_timestamp(line):
+    # Same form as the auditd detectors' timestamps (naive UTC ISO 8601);
+    # None lets create_event fall back to the current time
+    ts = parse_timestamp(line)
+    return None if ts is None else datetime.utcfromtimestamp(ts).isoformat()
@@ -0,0 +1,162 @@
+import os
+import glob
+import gzip
+import zlib
+from core import log
+from core.log_reader import find_tail_offset, split_lines
+
+OFFSET_PATH = "output/log_offset.txt"
+MAX_READ_BYTES = 64 * 1024 * 1024
+FINGERPRINT_BYTES = 64
+
+def open_log(path):
+    # Rotated logs may already have been compressed (audit.log.1.gz)
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def fingerprint(f, offset):
+    # CRC of the bytes just before `offset`. A file truncated and written
+    # again past the old offset keeps its inode and size, not these bytes.
+    start = max(offset - FINGERPRINT_BYTES, 0)
+    f.seek(start)
+    return f"{zlib.crc32(f.read(offset - start)):08x}"
+
+class LogTailer:
+    """
+    Follows an append-only log across runs by remembering (inode, byte offset).
+
+    Each call to `read_new_lines` returns only the complete lines written since
+    the last call. Rotation (the inode behind the path changed) drains the
+    remainder of the rotated file first, found by its inode or, once it has
+    been compressed, by the fingerprint at the offset; truncation restarts
+    at offset 0. A
+    fingerprint of the bytes before the offset, kept with it, also catches a
+    file truncated and written again past the offset between two reads.
+    The position is only persisted by `commit`, so a cycle that fails before
+    committing is read again instead of being skipped.
+    """
+
+    def __init__(self, path, offset_path=OFFSET_PATH, tail_lines=200, max_read_bytes=MAX_READ_BYTES):
+        self.path = path
+        self.offset_path = offset_path
+        self.tail_lines = tail_lines
+        self.max_read_bytes = max_read_bytes
+        self.inode, self.offset, self.fingerprint = self.load_offset()
+
+    def load_offset(self):
+        # "inode offset [fingerprint]"; offset files without one still load
+        try:
+            with open(self.offset_path, "r") as f:
+                fields = f.read().split()
+            return int(fields[0]), int(fields[1]), fields[2] if len(fields) > 2 else None
+        except Exception:
+            return None, 0, None
+
+    def position(self):
+        return self.inode, self.offset
+
+    def commit(self, position=None):
+        # `position` lets a pipeline persist the point its sinks have
+        # actually written, which may lag behind what was already read.
+        inode, offset = position or self.position()
+        if inode is None:
+            return
+        directory = os.path.dirname(self.offset_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        crc = self.fingerprint_at(inode, offset)
+        tmp_path = self.offset_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{inode} {offset} {crc}\n" if crc else f"{inode} {offset}\n")
+        os.replace(tmp_path, self.offset_path)
+
+    def fingerprint_at(self, inode, offset):
+        # None once the path no longer holds that inode (rotated away)
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_ino != inode:
+                    return None
+                return fingerprint(f, offset)
+        except OSError:
+            return None
+
+    def rewind(self, offset):
+        # Back to a point already read, e.g. to read held-back lines again
+        self.offset = offset
+        self.fingerprint = self.fingerprint_at(self.inode, offset)
+
+    def rewritten(self):
+        # Same inode, at least as large, but not the bytes that were read
+        if self.fingerprint is None or not self.offset:
+            return False
+        with open(self.path, "rb") as f:
+            return fingerprint(f, self.offset) != self.fingerprint
+
+    def find_rotated(self):
+        candidates = sorted(glob.glob(self.path + ".*"))
+        for candidate in candidates:
+            if candidate.endswith(".gz") or candidate.endswith(".tmp"):
+                continue
+            try:
+                if os.stat(candidate).st_ino == self.inode:
+                    return candidate
+            except OSError:
+                continue
+        # A compressed copy has an inode of its own: it is the one holding
+        # the bytes that were read before the offset
+        if self.fingerprint is None or not self.offset:
+            return None
+        for candidate in candidates:
+            if not candidate.endswith(".gz"):
+                continue
+            try:
+                with open_log(candidate) as f:
+                    if fingerprint(f, self.offset) == self.fingerprint:
+                        return candidate
+            except (OSError, EOFError, zlib.error):
+                continue
+        return None
+
+    def read_from(self, path, offset, final=False):
+        # Returns (lines, new_offset, reached_eof). Unless `final` is set, a
+        # trailing line without its newline is left for the next call.
+        with open_log(path) as f:
+            f.seek(offset)
+            data = f.read(self.max_read_bytes)
+            reached_eof = len(data) < self.max_read_bytes or not f.read(1)
+
+            if not (final and reached_eof):
+                cut = data.rfind(b"\n") + 1
+                if cut == 0 and not reached_eof:
+                    # A single line longer than the read budget: take it whole.
+                    cut = len(data)
+                if cut < len(data):
+                    reached_eof = False
+                data = data[:cut]
+            self.fingerprint = fingerprint(f, offset + len(data))
+
+        return split_lines(data), offset + len(data), reached_eof
+
+    def read_new_lines(self):
+        st = os.stat(self.path)
+
+        if self.inode is None:
+            with open(self.path, "rb") as f:
+                self.offset = find_tail_offset(f, self.tail_lines)
+            self.inode = st.st_ino
+
+        lines = []
+        if st.st_ino != self.inode:
+            rotated = self.find_rotated()
+            if rotated:
+                lines, self.offset, done = self.read_from(rotated, self.offset, final=True)
+                if not done:
+                    return lines
+            else:
+                log.warning(f"{self.path} was rotated, but the rotated file (inode {self.inode}) was not found; "
+                            f"lines written to it after offset {self.offset} are lost.")
+            self.inode, self.offset = st.st_ino, 0
+        elif st.st_size < self.offset or self.rewritten():
+            self.offset = 0
+
+        new_lines, self.offset, _ = self.read_from(self.path, self.offset)
+        return lines + new_lines
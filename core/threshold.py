@@ -0,0 +1,182 @@
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from models.event import create_event
+
+MAX_KEYS = 10000
+
+# Used when config.yaml has no `thresholds` section. `group_by` lists the
+# extra fields naming the key, first present one wins (auditd detectors
+# report `acct`/`addr`, the syslog ones `user`/`ip`).
+DEFAULT_THRESHOLDS = [
+    {
+        "name": "failed_login_per_user",
+        "event_types": ["FAILED_LOGIN"],
+        "group_by": ["acct", "user"],
+        "count": 5,
+        "window": 60,
+        "alert": "BRUTE_FORCE",
+    },
+    {
+        "name": "failed_login_per_addr",
+        "event_types": ["FAILED_LOGIN"],
+        "group_by": ["addr", "ip"],
+        "count": 10,
+        "window": 60,
+        "alert": "BRUTE_FORCE",
+    },
+    {
+        "name": "failed_login_per_exe",
+        "event_types": ["FAILED_LOGIN"],
+        "group_by": ["exe"],
+        "count": 30,
+        "window": 60,
+        "alert": "BRUTE_FORCE",
+    },
+    {
+        "name": "sudo_fail_per_user",
+        "event_types": ["SUDO_FAIL"],
+        "group_by": ["acct", "user"],
+        "count": 3,
+        "window": 120,
+        "alert": "SUDO_BRUTE_FORCE",
+    },
+]
+
+# Values that do not identify anybody and must not be grouped together
+UNKNOWN_VALUES = {None, "", "?", "N/A", "unknown", "(unknown)"}
+
+def event_time(event):
+    try:
+        ts = datetime.fromisoformat(event["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+def isoformat(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+
+class ThresholdRule:
+    def __init__(self, name, event_types, group_by, count, window, alert="THRESHOLD_EXCEEDED", severity="high"):
+        self.name = name
+        self.event_types = set(event_types)
+        self.group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+        self.count = max(int(count), 1)
+        self.window = float(window)
+        self.alert = alert
+        self.severity = severity
+
+    def key_of(self, event):
+        extra = event.get("extra", {})
+        for field in self.group_by:
+            value = extra.get(field)
+            if value not in UNKNOWN_VALUES:
+                return field, str(value)
+        return None
+
+class ThresholdAggregator:
+    """
+    Sliding-window counting over detector output: a rule fires when `count`
+    matching events share a key (user, address, exe, ...) within `window`
+    seconds of event time. Each key keeps only the timestamps of its last
+    `count` events (a bounded deque), keys idle for longer than their window
+    are dropped, and at most `max_keys` keys are tracked (least recently seen
+    evicted first).
+
+    A burst is the run of a key's events with no gap of a whole window; its
+    start and size are tracked apart from the bounded deque. A key fires at
+    most once per window: while the burst goes on and still meets the rule,
+    it fires again a window after its previous alert, each alert reporting
+    the burst's running size and time range.
+    """
+
+    def __init__(self, rules, max_keys=MAX_KEYS):
+        self.rules = rules
+        self.max_keys = max_keys
+        self.max_window = max((rule.window for rule in rules), default=0)
+        # (rule name, field, value) -> [timestamps deque, last seen, last alert, burst start, burst size]
+        self.windows = OrderedDict()
+        self.alerts = 0
+
+    @classmethod
+    def from_config(cls, config):
+        rules = config.get("thresholds", DEFAULT_THRESHOLDS) or []
+        return cls([ThresholdRule(**rule) for rule in rules])
+
+    def process(self, events):
+        if not self.rules:
+            return []
+        timed = []
+        for event in events:
+            ts = event_time(event)
+            if ts is not None:
+                timed.append((ts, event))
+        # Detectors emit per detector, not in time order
+        timed.sort(key=lambda item: item[0])
+
+        alerts = []
+        for ts, event in timed:
+            event_type = event.get("event_type")
+            for rule in self.rules:
+                if event_type not in rule.event_types:
+                    continue
+                key = rule.key_of(event)
+                if key is not None:
+                    alert = self.observe(rule, key, ts)
+                    if alert:
+                        alerts.append(alert)
+        return alerts
+
+    def observe(self, rule, key, ts):
+        window_key = (rule.name,) + key
+        state = self.windows.get(window_key)
+        if state is None or ts - state[1] > rule.window:
+            # New key, or the previous burst ended: start over
+            state = [deque(maxlen=rule.count), ts, None, ts, 0]
+            self.windows[window_key] = state
+        else:
+            self.windows.move_to_end(window_key)
+
+        times = state[0]
+        times.append(ts)
+        state[1] = max(state[1], ts)
+        state[3] = min(state[3], ts)
+        state[4] += 1
+        self.expire(ts)
+
+        if len(times) < rule.count or times[-1] - times[0] > rule.window:
+            return None
+        if state[2] is not None and ts - state[2] < rule.window:
+            return None
+        state[2] = ts
+        self.alerts += 1
+        return self.build_alert(rule, key, state[3], state[1], state[4])
+
+    def expire(self, now):
+        # Least recently seen first; stop at the first key still in use
+        windows = self.windows
+        while windows:
+            window_key, state = next(iter(windows.items()))
+            if len(windows) <= self.max_keys and now - state[1] <= self.max_window:
+                break
+            windows.popitem(last=False)
+
+    def build_alert(self, rule, key, first_seen, last_seen, count):
+        field, value = key
+        types = "/".join(sorted(rule.event_types))
+        return create_event(
+            event_type=rule.alert,
+            message=f"{count} {types} events for {field}={value} within {last_seen - first_seen:.0f}s",
+            source="threshold",
+            severity=rule.severity,
+            timestamp=isoformat(last_seen),
+            extra={
+                "rule": rule.name,
+                field: value,
+                "count": count,
+                "window": rule.window,
+                "first_seen": isoformat(first_seen),
+                "last_seen": isoformat(last_seen),
+            }
+        )
@@ -0,0 +1,57 @@
+import os
+import json
+import fcntl
+from core.dedup import HashIndex
+
+TOMBSTONES_PATH = "output/deleted_hashes.txt"
+LEGACY_PATH = "output/deleted_hashes.json"
+COMPACT_RATIO = 2
+
+class TombstoneStore(HashIndex):
+    """
+    Hashes of events deleted from the dashboard. Deletions are appended one
+    per line and never rewrite the file; readers keep an in-memory set and
+    only read what was appended since their last `refresh`.
+    """
+
+    def __init__(self, path=TOMBSTONES_PATH, legacy_path=LEGACY_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        super().__init__(path)
+        self.import_legacy(legacy_path)
+
+    def import_legacy(self, legacy_path):
+        # One-time migration of the old rewrite-on-every-delete JSON list
+        if not legacy_path or not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, "r") as f:
+                legacy = json.load(f)
+        except Exception:
+            legacy = []
+        self.rewrite(self.hashes | set(legacy))
+        os.replace(legacy_path, legacy_path + ".migrated")
+
+    def needs_compaction(self):
+        return self.line_count > COMPACT_RATIO * max(len(self.hashes), 1)
+
+    def compact(self):
+        # Concurrent writers can append the same hash twice; rewrite the
+        # file with each hash once. Appends wait for the exclusive lock, so
+        # none can land between the refresh and the replace.
+        with self.locked(fcntl.LOCK_EX):
+            self.refresh()
+            self.replace_file(self.hashes)
+
+_store = None
+
+def get_tombstones():
+    global _store
+    if _store is None:
+        _store = TombstoneStore()
+    else:
+        _store.refresh()
+    if _store.needs_compaction():
+        _store.compact()
+    return _store
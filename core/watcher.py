@@ -0,0 +1,74 @@
+import os
+import time
+import errno
+import select
+import ctypes
+import ctypes.util
+
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+POLL_INTERVAL = 0.5
+
+class FileWatcher:
+    """
+    Blocks until the watched file's directory changes (write, create or
+    rename, which covers rotation) using inotify, or falls back to sleeping
+    `poll_interval` seconds when inotify is not available.
+    """
+
+    def __init__(self, path, poll_interval=POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.fd = None
+        try:
+            self.fd = self.init_inotify(os.path.dirname(os.path.abspath(path)))
+        except Exception:
+            self.fd = None
+
+    @property
+    def mode(self):
+        return "inotify" if self.fd is not None else "polling"
+
+    def init_inotify(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CREATE | IN_MOVED_TO
+        if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, "inotify_add_watch failed")
+        return fd
+
+    def wait(self, timeout):
+        # Returns True when a change was signalled, False on timeout
+        if self.fd is None:
+            time.sleep(min(timeout, self.poll_interval))
+            return True
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        self.drain()
+        return True
+
+    def drain(self):
+        # Only the wake-up matters, the event records themselves are discarded
+        while True:
+            try:
+                if not os.read(self.fd, 4096):
+                    return
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    return
+                raise
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
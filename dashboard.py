@@ -1,19 +1,23 @@
 from core.analyzer import run_analysis
-from core.hash_utils import generate_event_hash
+from core.tombstones import get_tombstones
+from core.daemon import daemon_running
+from core.segments import get_event_log
+from main import ARCHIVE_PATH
+from core import db, bus, metrics, log
+from plugins import sound_loop
+from textual import work
 from textual.app import App, ComposeResult
+from textual.coordinate import Coordinate
 from textual.widgets import Header, Footer, DataTable, Static
 from textual.containers import Container
 from textual.timer import Timer
+import os
 import json
 import datetime
+import threading
 import yaml
 from pathlib import Path
 
-def log_debug(message):
-    with open("output/debug_log.txt", "a") as f:
-        timestamp = datetime.datetime.now().isoformat()
-        f.write(f"[{timestamp}] {message}\n")
-
 class NoctilogDashboard(App):
     BINDINGS = [
         ("q", "quit", "Quit"),
@@ -22,167 +26,366 @@ class NoctilogDashboard(App):
         ("v", "view_event", "Mark as Viewed"),
         ("e", "export", "Export Selected"),
         ("a", "toggle_ack", "Toggle Acknowledge"),
-        ("x", "delete_event", "Delete Acknowledged")
+        ("x", "delete_event", "Delete Acknowledged"),
+        ("n", "next_page", "Next Page"),
+        ("p", "prev_page", "Previous Page"),
+        ("m", "toggle_sound", "Toggle Sound")
     ]
     REFRESH_INTERVAL = 10
-    FILTER_OPTIONS = [None, "FAILED_LOGIN", "SUDO_FAIL", "ACCESS_DENIED"]
+    CLIENT_REFRESH_INTERVAL = 2
+    PAGE_SIZE = 200
+    FILTER_OPTIONS = [None, "FAILED_LOGIN", "SUDO_FAIL", "PRIVESC_EXEC", "BRUTE_FORCE", "SUDO_BRUTE_FORCE", "ACCESS_DENIED"]
     SORT_OPTIONS = ["none", "timestamp_asc", "timestamp_desc", "severity", "new_first", "ack_first"]
+    # Sort order -> (indexed columns paged through, descending)
+    SORT_KEYS = {
+        "none": (("id",), False),
+        "timestamp_asc": (("timestamp", "id"), False),
+        "timestamp_desc": (("timestamp", "id"), True),
+        "severity": (("severity_rank", "id"), True),
+        "new_first": (("viewed", "id"), False),
+        "ack_first": (("acknowledged", "id"), True),
+    }
     VIEWED_IDS_FILE = Path("output/viewed_ids.json")
+    COLUMNS = [
+        ("new", "🆕"), ("timestamp", "Timestamp"), ("type", "Type"), ("severity", "Severity"), ("count", "Count"),
+        ("user", "User"), ("pid", "PID"), ("message", "Message"), ("ack", "Ack")
+    ]
+    SEVERITY_EMOJI = {"low": "🟡", "medium": "🟠", "high": "🔴"}
+    STATS_HOURS = 24
+    STATS_TOP_USERS = 5
+    SPARK_BLOCKS = " ▁▂▃▄▅▆▇█"
 
     def __init__(self):
         super().__init__()
         with open("config.yaml", "r") as f:
             config = yaml.safe_load(f)
+        # Console output would draw over the TUI
+        log.configure(config.get("logging"), console=False)
         self.current_filter_index = 0
         self.current_sort_index = 0
-        self.events = []
-        self.viewed_ids = set()
-        self.load_viewed_ids()
-
-    def load_viewed_ids(self):
-        if self.VIEWED_IDS_FILE.exists():
-            try:
-                with open(self.VIEWED_IDS_FILE, "r") as f:
-                    self.viewed_ids = set(json.load(f))
-            except Exception:
-                self.viewed_ids = set()
-
-    def save_viewed_ids(self):
+        self.current_page = 0
+        # Keyset paging: the sort key of the row before each page visited
+        # so far (None: the first page), and of the current page's last row
+        self.page_starts = [None]
+        self.page_end = None
+        self.total_events = 0
+        self.events = {}
+        self.row_cells_by_key = {}
+        self.db_lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.sound_enabled = False
+        self.db_path = config["output"]["db"]
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.conn = db.init_db(self.db_path)
+        self.archive = get_event_log(ARCHIVE_PATH, config.get("segments"))
+        self.metrics_path = (config.get("metrics") or {}).get("textfile", metrics.TEXTFILE_PATH)
+        self.last_event_id = db.max_event_id(self.conn)
+        self.import_viewed_ids()
+
+    def import_viewed_ids(self):
+        # One-time move of the legacy viewed_ids.json into the events table
+        if not self.VIEWED_IDS_FILE.exists():
+            return
         try:
-            with open(self.VIEWED_IDS_FILE, "w") as f:
-                json.dump(list(self.viewed_ids), f)
-        except Exception:
-            pass
+            with open(self.VIEWED_IDS_FILE, "r") as f:
+                db.import_viewed_ids(self.conn, json.load(f))
+            self.VIEWED_IDS_FILE.rename(self.VIEWED_IDS_FILE.with_suffix(".json.migrated"))
+        except Exception as e:
+            log.error(f"Failed to import viewed ids: {e}")
 
     def compose(self) -> ComposeResult:
         yield Header()
         yield Container(
             Static("🦉 Noctilog - SIEM Dashboard", id="status"),
+            Static("", id="stats", markup=False),
             DataTable(id="events_table"),
+            Static("", id="metrics", markup=False),
             id="main"
         )
         yield Footer()
 
     def on_mount(self):
         self.status: Static = self.query_one("#status")
+        self.stats: Static = self.query_one("#stats")
+        self.metrics: Static = self.query_one("#metrics")
         self.table: DataTable = self.query_one("#events_table")
         self.table.cursor_type = "row"
-        self.table.add_columns("🆕", "Timestamp", "Type", "Severity", "User", "PID", "Message", "Ack")
+        for key, label in self.COLUMNS:
+            self.table.add_column(label, key=key)
+        self.refresh_data()
+        # With noctilogd running the dashboard only reads its store, which is
+        # cheap enough to poll more often.
+        interval = self.CLIENT_REFRESH_INTERVAL if daemon_running() else self.REFRESH_INTERVAL
+        self.refresh_timer: Timer = self.set_interval(interval, self.request_refresh)
+        # Plays the highest unacknowledged severity while enabled, kept
+        # current by the insert/acknowledge notifications below
+        sound_loop.start_sound_loop(self.db_path)
+
+    def on_unmount(self):
+        sound_loop.stop_sound_loop()
+
+    def request_refresh(self):
         self.refresh_data()
-        self.refresh_timer: Timer = self.set_interval(self.REFRESH_INTERVAL, self.refresh_data)
 
+    @work(thread=True, exclusive=True, group="analysis")
     def refresh_data(self):
-        run_analysis()
-        self.table.clear()
-        self.events = []
+        # Runs off the event loop: analysis and the page query never block
+        # the UI, only the resulting page is posted back. `exclusive` cannot
+        # stop a thread that is already running, so a refresh due while the
+        # previous one still runs is skipped rather than run alongside it.
+        if not self.refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if not daemon_running():
+                try:
+                    run_analysis()
+                except Exception as e:
+                    log.error(f"Analysis failed: {e}")
+            else:
+                self.publish_new_events()
+            self.load_page()
+        finally:
+            self.refresh_lock.release()
+
+    def publish_new_events(self):
+        # noctilogd inserts in its own process, so announce its new rows here
+        with self.db_lock:
+            rows = db.events_since(self.conn, self.last_event_id)
+        if rows:
+            self.last_event_id = rows[-1][0]
+            bus.publish(bus.EVENTS_INSERTED, [event for _, event in rows])
 
-        severity_emoji = {"low": "🟡", "medium": "🟠", "high": "🔴"}
-        severity_rank = {"low": 1, "medium": 2, "high": 3}
+    @work(thread=True, exclusive=True, group="page")
+    def reload_page(self):
+        self.load_page()
+
+    def query_filter(self):
         filter_type = self.FILTER_OPTIONS[self.current_filter_index]
-        sort_mode = self.SORT_OPTIONS[self.current_sort_index]
-        events_path = Path("output/events.jsonl")
-
-        if events_path.exists():
-            with open(events_path, "r") as f:
-                for line in f:
-                    try:
-                        event = json.loads(line.strip())
-                        if filter_type and event.get("event_type") != filter_type:
-                            continue
-                        self.events.append(event)
-                    except json.JSONDecodeError:
-                        continue
-
-        for e in self.events:
-            e["_is_viewed"] = (e.get("timestamp", "") + e.get("event_type", "")) in self.viewed_ids
-            e["_ack"] = e.get("acknowledged", False)
-            e["_severity_rank"] = severity_rank.get(e.get("severity", "medium"), 2)
-
-        if sort_mode == "timestamp_asc":
-            self.events.sort(key=lambda e: e.get("timestamp", ""))
-        elif sort_mode == "timestamp_desc":
-            self.events.sort(key=lambda e: e.get("timestamp", ""), reverse=True)
-        elif sort_mode == "severity":
-            self.events.sort(key=lambda e: e["_severity_rank"], reverse=True)
-        elif sort_mode == "new_first":
-            self.events.sort(key=lambda e: e["_is_viewed"])
-        elif sort_mode == "ack_first":
-            self.events.sort(key=lambda e: not e["_ack"])
-
-        for event in self.events:
-            extra = event.get("extra", {})
-            sev = event.get("severity", "medium")
-            sev_display = f"{severity_emoji.get(sev, '')} {sev}"
-            event_id = event.get("timestamp", "") + event.get("event_type", "")
-            new_status = "🆕" if not event["_is_viewed"] else ""
-            self.table.add_row(
-                new_status,
-                event.get("timestamp", ""),
-                event.get("event_type", ""),
-                sev_display,
-                extra.get("user", "—"),
-                str(extra.get("pid", "—")),
-                event.get("message", "")[:80] + "..." if len(event.get("message", "")) > 80 else event.get("message", ""),
-                "Yes" if event["_ack"] else "No"
-            )
+        if filter_type:
+            return "event_type = ?", (filter_type,)
+        return "", ()
+
+    def reset_paging(self):
+        self.current_page = 0
+        self.page_starts = [None]
+        self.page_end = None
+
+    def load_page(self):
+        where, params = self.query_filter()
+        keys, descending = self.SORT_KEYS[self.SORT_OPTIONS[self.current_sort_index]]
+        page = self.current_page
+        with self.db_lock:
+            total = db.live_count(self.conn, self.FILTER_OPTIONS[self.current_filter_index])
+            rows = db.query_page(self.conn, where, params, keys, descending, self.PAGE_SIZE, self.page_starts[page])
+            if not rows and page:
+                # Everything from this page on was deleted: back to the first
+                page = 0
+                rows = db.query_page(self.conn, where, params, keys, descending, self.PAGE_SIZE)
+            stats = self.load_stats()
+        self.page_end = rows[-1][0] if rows else None
+        events = [event for _, event in rows]
+        self.call_from_thread(self.apply_page, events, total, page)
+        self.call_from_thread(self.apply_stats, *stats)
+        self.call_from_thread(self.metrics.update, metrics.summary(self.load_metrics()))
+
+    def load_metrics(self):
+        # This process's own timings (render, and everything else in
+        # one-shot mode), overlaid with what noctilogd last exported
+        samples = metrics.samples()
+        if daemon_running():
+            samples.update(metrics.read_textfile(self.metrics_path))
+        return samples
+
+    def load_stats(self):
+        # Reads the pre-aggregated statistics tables, so the cost depends on
+        # the number of hour buckets and users, not on the number of events.
+        # Event timestamps are naive UTC.
+        now = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        hours = [(now - datetime.timedelta(hours=n)).strftime("%Y-%m-%dT%H") for n in range(self.STATS_HOURS - 1, -1, -1)]
+        return (
+            hours,
+            db.hourly_counts(self.conn, hours[0]),
+            db.top_users(self.conn, self.STATS_TOP_USERS),
+            db.unacknowledged_counts(self.conn),
+        )
+
+    def apply_stats(self, hours, hourly, users, unacknowledged):
+        per_hour = dict.fromkeys(hours, 0)
+        per_type = {}
+        for hour, event_type, count in hourly:
+            if hour in per_hour:
+                per_hour[hour] += count
+                per_type[event_type] = per_type.get(event_type, 0) + count
+
+        peak = max(per_hour.values())
+        top = len(self.SPARK_BLOCKS) - 1
+        spark = "".join(
+            self.SPARK_BLOCKS[-(-count * top // peak)] if peak else self.SPARK_BLOCKS[0]
+            for count in per_hour.values()
+        )
+        types = " · ".join(
+            f"{event_type} {count}" for event_type, count in sorted(per_type.items(), key=lambda item: -item[1])
+        ) or "none"
+        top_users = ", ".join(f"{user} {count}" for user, count in users) or "none"
+        unacked = " ".join(
+            f"{self.SEVERITY_EMOJI[sev]} {unacknowledged.get(sev, 0)}" for sev in ("high", "medium", "low")
+        )
+        self.stats.update(
+            f"Last {self.STATS_HOURS}h │{spark}│ {sum(per_hour.values())} events: {types}\n"
+            f"Top users: {top_users} | Unacknowledged: {unacked}"
+        )
 
+    def apply_page(self, events, total, page):
+        # Diffs the fetched page against the table by event hash: rows that
+        # left the page are removed, changed cells updated, new rows added.
+        with metrics.time_stage("render"):
+            self.sync_page(events, total, page)
+
+    def sync_page(self, events, total, page):
+        self.total_events = total
+        self.current_page = page
+        page_keys = [event["event_hash"] for event in events]
+        self.events = {event["event_hash"]: event for event in events}
+
+        for key in list(self.row_cells_by_key):
+            if key not in self.events:
+                self.table.remove_row(key)
+                del self.row_cells_by_key[key]
+        for event in events:
+            self.sync_row(event)
+
+        table_keys = [row_key.value for row_key in self.table.rows]
+        if table_keys != page_keys:
+            self.reorder_rows(page_keys)
+        self.update_status()
+
+    def reorder_rows(self, page_keys):
+        selected = self.selected_event()
+        self.table.clear()
+        self.row_cells_by_key = {}
+        for key in page_keys:
+            self.sync_row(self.events[key])
+        if selected and selected["event_hash"] in self.row_cells_by_key:
+            self.table.move_cursor(row=self.table.get_row_index(selected["event_hash"]))
+
+    def row_cells(self, event):
+        extra = event.get("extra", {})
+        sev = event.get("severity", "medium")
+        message = event.get("message", "")
+        return (
+            "🆕" if not event.get("viewed") else "",
+            event.get("timestamp", ""),
+            event.get("event_type", ""),
+            f"{self.SEVERITY_EMOJI.get(sev, '')} {sev}",
+            f"×{event.get('count', 1)}" if event.get("count", 1) > 1 else "",
+            extra.get("user", "—"),
+            str(extra.get("pid", "—")),
+            message[:80] + "..." if len(message) > 80 else message,
+            "Yes" if event.get("acknowledged", False) else "No"
+        )
+
+    def sync_row(self, event):
+        key = event["event_hash"]
+        cells = self.row_cells(event)
+        if key not in self.row_cells_by_key:
+            self.table.add_row(*cells, key=key)
+            self.row_cells_by_key[key] = cells
+            return
+
+        old_cells = self.row_cells_by_key[key]
+        for (column_key, _), old, new in zip(self.COLUMNS, old_cells, cells):
+            if old != new:
+                self.table.update_cell(key, column_key, new)
+        self.row_cells_by_key[key] = cells
+
+    def remove_event(self, key):
+        self.events.pop(key, None)
+        self.total_events = max(self.total_events - 1, 0)
+        if key in self.row_cells_by_key:
+            self.table.remove_row(key)
+            del self.row_cells_by_key[key]
+
+    def update_status(self):
         filter_label = self.FILTER_OPTIONS[self.current_filter_index] or "All"
         sort_label = self.SORT_OPTIONS[self.current_sort_index]
-        self.status.update(f"🟢 Noctilog - {len(self.events)} events (Filter: {filter_label}, Sort: {sort_label})")
+        pages = max((self.total_events - 1) // self.PAGE_SIZE, 0) + 1
+        self.status.update(
+            f"🟢 Noctilog - {self.total_events} events "
+            f"(Filter: {filter_label}, Sort: {sort_label}, Page {self.current_page + 1}/{pages})"
+        )
+
+    def selected_event(self):
+        if not self.row_cells_by_key or self.table.cursor_row is None:
+            return None
+        try:
+            row_key = self.table.coordinate_to_cell_key(Coordinate(self.table.cursor_row, 0)).row_key
+        except Exception:
+            return None
+        return self.events.get(row_key.value)
 
     def action_view_event(self):
-        if not self.events or self.table.cursor_row is None:
+        event = self.selected_event()
+        if event is None:
             return
-        idx = self.table.cursor_row
-        event = self.events[idx]
-        event_id = event.get("timestamp", "") + event.get("event_type", "")
-        self.viewed_ids.add(event_id)
-        self.save_viewed_ids()
-        self.refresh_data()
+        event["viewed"] = True
+        with self.db_lock:
+            db.set_viewed(self.conn, event["event_hash"])
+        self.sync_row(event)
 
     def action_toggle_ack(self):
-        if not self.events or self.table.cursor_row is None:
+        event = self.selected_event()
+        if event is None:
             return
-        idx = self.table.cursor_row
-        event = self.events[idx]
         event["acknowledged"] = not event.get("acknowledged", False)
-        event_id = event.get("timestamp", "") + event.get("event_type", "")
-        self.viewed_ids.add(event_id)
-        self.save_viewed_ids()
-        with open("output/events.jsonl", "w") as f:
-            for e in self.events:
-                f.write(json.dumps(e) + "\n")
-        self.refresh_data()
+        event["viewed"] = True
+        with self.db_lock:
+            db.set_acknowledged(self.conn, event["event_hash"], event["acknowledged"])
+        bus.publish(bus.EVENT_ACKNOWLEDGED, event)
+        self.sync_row(event)
 
     def action_delete_event(self):
-        if not self.events or self.table.cursor_row is None:
+        event = self.selected_event()
+        if event is None:
             return
-        idx = self.table.cursor_row
-        event = self.events[idx]
         if event.get("acknowledged"):
             self.archive_event(event)
-            event_hash = event.get("event_hash")
-            if not event_hash:
-                event_hash = generate_event_hash(event)
-            save_deleted_hash(event_hash)
-            del self.events[idx]
-            with open("output/events.jsonl", "w") as f:
-                for e in self.events:
-                    f.write(json.dumps(e) + "\n")
-            self.refresh_data()
+            save_deleted_hash(event["event_hash"])
+            with self.db_lock:
+                db.delete_event(self.conn, event["event_hash"])
+            self.remove_event(event["event_hash"])
+            self.update_status()
+
+    def action_toggle_sound(self):
+        self.sound_enabled = not self.sound_enabled
+        sound_loop.set_sound_enabled(self.sound_enabled)
+        self.status.update("🔔 Sound alerts on" if self.sound_enabled else "🔕 Sound alerts off")
 
     def action_filter(self):
         self.current_filter_index = (self.current_filter_index + 1) % len(self.FILTER_OPTIONS)
-        self.refresh_data()
+        self.reset_paging()
+        self.reload_page()
 
     def action_sort(self):
         self.current_sort_index = (self.current_sort_index + 1) % len(self.SORT_OPTIONS)
-        self.refresh_data()
+        self.reset_paging()
+        self.reload_page()
+
+    def action_next_page(self):
+        if self.page_end is not None and (self.current_page + 1) * self.PAGE_SIZE < self.total_events:
+            del self.page_starts[self.current_page + 1:]
+            self.page_starts.append(self.page_end)
+            self.current_page += 1
+            self.reload_page()
+
+    def action_prev_page(self):
+        if self.current_page > 0:
+            self.current_page -= 1
+            self.reload_page()
 
     def action_export(self):
-        if not self.events or self.table.cursor_row is None:
+        event = self.selected_event()
+        if event is None:
             return
-        event = self.events[self.table.cursor_row]
         export_dir = Path("output/exports")
         export_dir.mkdir(parents=True, exist_ok=True)
         ts = event.get("timestamp", "").replace(":", "-").replace("T", "_")
@@ -193,25 +396,19 @@ class NoctilogDashboard(App):
             f.write(f"Type      : {event.get('event_type', '')}\n")
             f.write(f"Severity  : {event.get('severity', '')}\n")
             f.write(f"Message   : {event.get('message', '')}\n")
+            if event.get("count", 1) > 1:
+                f.write(f"Count     : {event['count']} ({event.get('first_seen')} → {event.get('last_seen')})\n")
             f.write(f"Extra     : {json.dumps(event.get('extra', {}), indent=2)}\n")
+            if event.get("process"):
+                f.write(f"Process   : {json.dumps(event['process'], indent=2)}\n")
             f.write(f"Acknowledged : {'Yes' if event.get('acknowledged', False) else 'No'}\n")
         self.status.update(f"📁 Exported to {filename}")
 
     def archive_event(self, event):
-        archive_path = Path("output/archived_events.jsonl")
-        with open(archive_path, "a") as f:
-            f.write(json.dumps(event) + "\n")
+        self.archive.append([event])
 
 def save_deleted_hash(event_hash):
-    path = Path("output/deleted_hashes.json")
-    if not path.exists():
-        path.write_text("[]")
-    try:
-        hashes = set(json.loads(path.read_text()))
-    except:
-        hashes = set()
-    hashes.add(event_hash)
-    path.write_text(json.dumps(list(hashes)))
+    get_tombstones().add(event_hash)
 
 if __name__ == "__main__":
     from core.analyzer import run_analysis
@@ -1,5 +1,8 @@
 import re
 from models.event import create_event
+from core.syslog import event_timestamp
+
+RECORD_TYPES = ("syslog",)
 
 def detect(lines, source="auth.log"):
     events = []
@@ -14,6 +17,7 @@ def detect(lines, source="auth.log"):
                 event_type="ACCESS_DENIED",
                 message=line.strip(),
                 source=source,
+                timestamp=event_timestamp(line),
                 severity="high",
                 extra={
                     "pid": pid
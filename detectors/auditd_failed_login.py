@@ -1,19 +1,9 @@
-import re
-import pwd
 from datetime import datetime
 from models.event import create_event
+from core.auditd import parse_record
+from core.enrich import uid_to_user
 
-def uid_to_user(uid):
-    try:
-        if int(uid) == 4294967295:
-            return "unknown"
-        return pwd.getpwuid(int(uid)).pw_name
-    except Exception:
-        return f"UID:{uid}"
-
-def extract_field(line, key):
-    match = re.search(rf"{key}=([^\s]+)", line)
-    return match.group(1).strip('"') if match else "N/A"
+RECORD_TYPES = ("USER_LOGIN",)
 
 def detect(lines, source="audit.log"):
     events = []
@@ -22,30 +12,26 @@ def detect(lines, source="audit.log"):
         if "USER_LOGIN" not in line or "res=failed" not in line:
             continue
 
-        # Timestamp
-        ts_match = re.search(r"audit\((\d+\.\d+):\d+\)", line)
-        try:
-            ts_float = float(ts_match.group(1)) if ts_match else None
-            timestamp = datetime.utcfromtimestamp(ts_float).isoformat() if ts_float else datetime.utcnow().isoformat()
-        except Exception:
-            timestamp = datetime.utcnow().isoformat()
+        record = parse_record(line)
+        if record is None or record.get("res") != "failed":
+            continue
 
-        uid = extract_field(line, "uid")
-        auid = extract_field(line, "auid")
-        pid = extract_field(line, "pid")
-        exe = extract_field(line, "exe")
+        auid = record.get("auid", "N/A")
 
         events.append(create_event(
             event_type="FAILED_LOGIN",
-            message=f"Auditd login failed - exe={exe}",
+            message=f"Auditd login failed - exe={record.get('exe', 'N/A')}",
             source=source,
             severity="medium",
-            timestamp=timestamp,
+            timestamp=datetime.utcfromtimestamp(record.timestamp).isoformat(),
             extra={
-                "uid": uid,
+                "uid": record.get("uid", "N/A"),
                 "auid": auid,
                 "user": uid_to_user(auid),
-                "pid": pid
+                "pid": record.get("pid", "N/A"),
+                "acct": record.get("acct", "N/A"),
+                "addr": record.get("addr", "N/A"),
+                "exe": record.get("exe", "N/A")
             }
         ))
 
@@ -0,0 +1,70 @@
+from datetime import datetime
+from models.event import create_event
+from core.auditd import parse_record
+from core.enrich import uid_to_user
+
+# Matches the `-k sudo_fail` rules in config/auditd.rules (uid != euid, euid = 0)
+AUDIT_KEYS = ("sudo_fail",)
+
+def build_cmdline(records):
+    execve = records.get("EXECVE")
+    if execve:
+        args = {}
+        for line in execve:
+            record = parse_record(line)
+            if record is None:
+                continue
+            for key in record.fields:
+                if key[0] == "a" and key[1:].isdigit():
+                    args[int(key[1:])] = record.get(key) or ""
+        if args:
+            return " ".join(args[i] for i in sorted(args))
+
+    proctitle = records.get("PROCTITLE")
+    if proctitle:
+        record = parse_record(proctitle[0])
+        if record is not None:
+            return record.get("proctitle")
+    return None
+
+def detect_events(audit_events, source="audit.log"):
+    events = []
+
+    for audit_event in audit_events:
+        records = audit_event["records"]
+        syscall = records.get("SYSCALL")
+        if not syscall:
+            continue
+        record = parse_record(syscall[0])
+        if record is None:
+            continue
+
+        uid = record.get("uid", "N/A")
+        auid = record.get("auid", "N/A")
+        exe = record.get("exe", "N/A")
+        cmdline = build_cmdline(records) or exe
+        cwd_record = parse_record(records["CWD"][0]) if records.get("CWD") else None
+        cwd = cwd_record.get("cwd", "N/A") if cwd_record else "N/A"
+
+        events.append(create_event(
+            event_type="PRIVESC_EXEC",
+            message=f"Privileged exec (uid={uid}, euid=0): {cmdline}",
+            source=source,
+            severity="high",
+            timestamp=datetime.utcfromtimestamp(audit_event["timestamp"]).isoformat(),
+            extra={
+                "uid": uid,
+                "auid": auid,
+                "euid": record.get("euid", "N/A"),
+                "user": uid_to_user(auid),
+                "pid": record.get("pid", "N/A"),
+                "ppid": record.get("ppid", "N/A"),
+                "exe": exe,
+                "cmdline": cmdline,
+                "cwd": cwd,
+                "success": record.get("success", "N/A"),
+                "key": audit_event["key"]
+            }
+        ))
+
+    return events
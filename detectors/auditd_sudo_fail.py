@@ -1,15 +1,9 @@
-import re
-import pwd
 from datetime import datetime
 from models.event import create_event
+from core.auditd import parse_record
+from core.enrich import uid_to_user
 
-def uid_to_user(uid):
-    try:
-        if int(uid) == 4294967295:
-            return "unknown"
-        return pwd.getpwuid(int(uid)).pw_name
-    except Exception:
-        return f"UID:{uid}"
+RECORD_TYPES = ("USER_AUTH",)
 
 def detect(lines, source="audit.log"):
     events = []
@@ -20,27 +14,25 @@ def detect(lines, source="audit.log"):
         if 'exe="/usr/bin/sudo"' not in line:
             continue
 
-        ts = re.search(r'audit\((\d+\.\d+):\d+\)', line)
-        timestamp = datetime.utcfromtimestamp(float(ts.group(1))).isoformat() if ts else datetime.utcnow().isoformat()
-
-        uid = re.search(r'uid=(\d+)', line)
-        auid = re.search(r'auid=(\d+)', line)
-        pid = re.search(r'pid=(\d+)', line)
-        exe = re.search(r'exe="([^"]+)"', line)
+        record = parse_record(line)
+        if record is None or record.get("res") != "failed" or record.get("exe") != "/usr/bin/sudo":
+            continue
 
-        auid_val = auid.group(1) if auid else "N/A"
+        auid = record.get("auid", "N/A")
 
         events.append(create_event(
             event_type="SUDO_FAIL",
-            message=f"Sudo failed authentication: {exe.group(1) if exe else 'N/A'}",
+            message=f"Sudo failed authentication: {record.get('exe')}",
             source=source,
             severity="high",
-            timestamp=timestamp,
+            timestamp=datetime.utcfromtimestamp(record.timestamp).isoformat(),
             extra={
-                "uid": uid.group(1) if uid else "N/A",
-                "auid": auid_val,
-                "user": uid_to_user(auid_val),
-                "pid": pid.group(1) if pid else "N/A"
+                "uid": record.get("uid", "N/A"),
+                "auid": auid,
+                "user": uid_to_user(auid),
+                "pid": record.get("pid", "N/A"),
+                "acct": record.get("acct", "N/A"),
+                "terminal": record.get("terminal", "N/A")
             }
         ))
 
@@ -1,5 +1,8 @@
 import re
 from models.event import create_event
+from core.syslog import event_timestamp
+
+RECORD_TYPES = ("sshd",)
 
 def detect(lines, source="auth.log"):
     events = []
@@ -21,6 +24,7 @@ def detect(lines, source="auth.log"):
                 event_type="FAILED_LOGIN",
                 message=f"Failed login for user '{user}' from {ip}:{port}",
                 source=source,
+                timestamp=event_timestamp(line),
                 severity="medium",
                 extra={
                     "user": user,
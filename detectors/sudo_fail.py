@@ -1,5 +1,8 @@
 import re
 from models.event import create_event
+from core.syslog import event_timestamp
+
+RECORD_TYPES = ("sudo",)
 
 def detect(lines, source="auth.log"):
     events = []
@@ -16,6 +19,7 @@ def detect(lines, source="auth.log"):
                 event_type="SUDO_FAIL",
                 message=line.strip(),
                 source=source,
+                timestamp=event_timestamp(line),
                 severity="high",
                 extra={
                     "user": user,
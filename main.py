@@ -1,27 +1,52 @@
 import os
 import sys
 import yaml
-import json
-import hashlib
-import datetime
-from core import db
-from detectors import auditd_sudo_fail, auditd_failed_login
+from core import db, bus, metrics, log
+from core.hash_utils import generate_event_hash
+from core.enrich import enrich_event
+from core.tailer import OFFSET_PATH, MAX_READ_BYTES
+from core.sources import AUDITD, SYSLOG, Source, parse_log_files, offset_path, read_all, merge_events
+from core.audisp import AudispSource, FILE, MODES as AUDISP_MODES, SOCKET_PATH as AUDISP_SOCKET_PATH
+from core.dedup import get_jsonl_index
+from core.segments import get_event_log
+from core.tombstones import get_tombstones
+from core.engine import DetectionEngine
+from core.threshold import ThresholdAggregator
+from core.coalesce import StormCoalescer
+from core.rules import load_rules
+from detectors import auditd_sudo_fail, auditd_failed_login, auditd_privesc_exec, failed_login, sudo_fail, access_denied
 
-DELETED_HASHES_PATH = "output/deleted_hashes.json"
 AUDIT_LOG_PATH = "/var/log/audit/audit.log"
+ARCHIVE_PATH = "output/archived_events.jsonl"
+
+DETECTOR_MODULES = {
+    "auditd_failed_login": auditd_failed_login,
+    "auditd_sudo_fail": auditd_sudo_fail,
+    "auditd_privesc_exec": auditd_privesc_exec,
+    "failed_login": failed_login,
+    "sudo_fail": sudo_fail,
+    "access_denied": access_denied,
+}
+
+# Log format each detector module reads
+DETECTOR_FORMATS = {
+    "auditd_failed_login": AUDITD,
+    "auditd_sudo_fail": AUDITD,
+    "auditd_privesc_exec": AUDITD,
+    "failed_login": SYSLOG,
+    "sudo_fail": SYSLOG,
+    "access_denied": SYSLOG,
+}
+
+_sources = None
+_engines = {}
+_aggregator = None
+_coalescer = None
 
 if os.geteuid() != 0:
     print("❌ This script must be run as root. Use: sudo python3 main.py")
     sys.exit(1)
 
-def log_debug(message):
-    os.makedirs("output", exist_ok=True)
-    timestamp = datetime.datetime.now().isoformat()
-    full_msg = f"[{timestamp}] [Noctilog] {message}"
-    with open("output/debug_log.txt", "a") as f:
-        f.write(full_msg + "\n")
-    print(full_msg)
-
 def load_config():
     with open("config.yaml", "r") as f:
         return yaml.safe_load(f)
@@ -29,118 +54,301 @@ def load_config():
 def ensure_rules_installed():
     rules_path = "/etc/audit/rules.d/noctilog.rules"
     if not os.path.exists(rules_path):
-        log_debug("Persistent rules not found. Installing...")
+        log.info("Persistent rules not found. Installing...")
         try:
             from install_rules import install_persistent_rules
             install_persistent_rules()
         except Exception as e:
-            log_debug(f"Failed to install persistent rules: {e}")
+            log.error(f"Failed to install persistent rules: {e}")
     else:
-        log_debug("Persistent audit rules already present.")
+        log.info("Persistent audit rules already present.")
 
 def load_auditd_rules():
     try:
         os.system("auditctl -D")
         result = os.system("auditctl -R config/auditd.rules")
         if result == 0:
-            log_debug("Auditd rules loaded successfully.")
+            log.info("Auditd rules loaded successfully.")
         else:
-            log_debug("Failed to load auditd rules.")
+            log.error("Failed to load auditd rules.")
     except Exception as e:
-        log_debug(f"Exception while loading auditd rules: {e}")
+        log.error(f"Exception while loading auditd rules: {e}")
 
 def load_deleted_hashes():
-    if not os.path.exists(DELETED_HASHES_PATH):
-        return set()
     try:
-        with open(DELETED_HASHES_PATH, "r") as f:
-            return set(json.load(f))
+        return get_tombstones()
     except Exception as e:
-        log_debug(f"Failed to load deleted hashes: {e}")
+        log.error(f"Failed to load deleted hashes: {e}")
         return set()
 
-def read_audit_log(tail_lines=200):
-    try:
-        with open(AUDIT_LOG_PATH, "r") as f:
-            return f.readlines()[-tail_lines:]
-    except Exception as e:
-        log_debug(f"Error reading audit log: {e}")
-        return []
+def build_sources(config, max_read_bytes=MAX_READ_BYTES, audisp=None):
+    """
+    One Source per `log_files` entry, each with its own tailer and its own
+    detection engine. audit.log keeps the offset file it always had. With
+    `audisp` settings (noctilogd) whose mode is not "file", the auditd log
+    (/var/log/audit/audit.log, or else the first file in auditd format) is
+    fed by auditd's dispatcher instead (see core.audisp).
+    """
+    tail_lines = config.get("log_tail_lines", 200)
+    mode = (audisp or {}).get("mode", FILE)
+    if mode not in AUDISP_MODES:
+        raise ValueError(f"audisp: unknown mode {mode!r} (expected {', '.join(AUDISP_MODES)})")
+    specs = parse_log_files(config.get("log_files") or [AUDIT_LOG_PATH])
+    fed = None
+    if mode != FILE:
+        auditd_paths = [spec["path"] for spec in specs if spec["format"] == AUDITD]
+        if not auditd_paths:
+            log.warning(f"audisp: mode {mode!r} ignored, no log file in {AUDITD} format is configured.")
+        else:
+            fed = AUDIT_LOG_PATH if AUDIT_LOG_PATH in auditd_paths else auditd_paths[0]
+    sources = []
+    for spec in specs:
+        path = spec["path"]
+        engine = build_engine(config, spec["format"], spec["detectors"])
+        offset = OFFSET_PATH if path == AUDIT_LOG_PATH else offset_path(path)
+        if path == fed:
+            socket_path = audisp.get("socket", AUDISP_SOCKET_PATH)
+            sources.append(AudispSource(path, spec["format"], engine, offset, tail_lines, max_read_bytes, mode, socket_path))
+        else:
+            sources.append(Source(path, spec["format"], engine, offset, tail_lines, max_read_bytes))
+    return sources
+
+def get_sources(config):
+    global _sources
+    if _sources is None:
+        _sources = build_sources(config)
+    return _sources
+
+def read_sources(config):
+    # Lines appended to every source since its last committed offset, read
+    # concurrently; `log_tail_lines` bounds the very first read of a file.
+    # The records of auditd events still open at the end of a read are left
+    # for the next run (see Source.hold_open_events).
+    with metrics.time_stage("read"):
+        reads = read_all(get_sources(config))
+    reads = [(source,) + source.hold_open_events(lines, position) for source, lines, position in reads]
+    metrics.LINES_READ.inc(sum(len(lines) for _, lines, _ in reads))
+    return reads
+
+def commit_offsets(reads):
+    for source, _, position in reads:
+        try:
+            source.tailer.commit(position)
+        except Exception as e:
+            log.error(f"Failed to save log offset of {source.path}: {e}")
+
+def build_engine(config, fmt=AUDITD, detectors=None):
+    # `detectors` names modules explicitly; by default the modules enabled
+    # under `modules:` for this format, plus the rules file for auditd logs
+    if detectors is None:
+        names = [name for name in DETECTOR_MODULES if config["modules"].get(name) and DETECTOR_FORMATS[name] == fmt]
+    else:
+        names = list(detectors)
+    engine = DetectionEngine()
+    for name in names:
+        if name in DETECTOR_MODULES:
+            engine.register_module(name, DETECTOR_MODULES[name])
+        elif name != "rules":
+            log.warning(f"Unknown detector {name!r} ignored.")
+    rules_path = config.get("rules_file")
+    if rules_path and fmt == AUDITD and (detectors is None or "rules" in detectors):
+        try:
+            ruleset = load_rules(rules_path)
+            engine.register("rules", ruleset.detect, ruleset.record_types)
+            log.info(f"{len(ruleset.rules)} detection rule(s) loaded from {rules_path}.")
+        except Exception as e:
+            log.error(f"Failed to load detection rules from {rules_path}: {e}")
+    return engine
+
+def get_engine(config, fmt=AUDITD):
+    # Shared engine for callers that only see one format at a time
+    # (backfill, run_detectors); sources each build their own
+    enabled = tuple(name for name in DETECTOR_MODULES if config["modules"].get(name))
+    key = (fmt, enabled, config.get("rules_file"))
+    engine = _engines.get(key)
+    if engine is None:
+        engine = _engines[key] = build_engine(config, fmt)
+    return engine
+
+def get_aggregator(config):
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = ThresholdAggregator.from_config(config)
+    return _aggregator
+
+def apply_thresholds(config, events):
+    # Adds one aggregate alert per burst of failures (see core.threshold)
+    return events + get_aggregator(config).process(events)
 
 def run_detectors(config, audit_lines):
-    events = []
-    if config["modules"].get("auditd_failed_login"):
-        events += auditd_failed_login.detect(audit_lines)
-    if config["modules"].get("auditd_sudo_fail"):
-        events += auditd_sudo_fail.detect(audit_lines)
+    with metrics.time_stage("detect"):
+        events = apply_thresholds(config, get_engine(config).run(audit_lines))
+    metrics.EVENTS_DETECTED.inc(len(events))
+    return events
+
+def detect_sources(config, reads):
+    # Each source runs its own detectors; their event streams are merged in
+    # timestamp order before the threshold rules correlate them.
+    with metrics.time_stage("detect"):
+        streams = [source.detect(lines) for source, lines, _ in reads if lines]
+        events = apply_thresholds(config, merge_events(streams))
+    metrics.EVENTS_DETECTED.inc(len(events))
     return events
 
-def generate_event_hash(event):
-    h = hashlib.sha256()
-    timestamp = event.get("timestamp", "")
-    content = f"{timestamp}|{event.get('event_type')}|{event.get('message')}|{json.dumps(event.get('extra', {}), sort_keys=True)}"
-    h.update(content.encode("utf-8"))
-    return h.hexdigest()
+def describe_reads(reads):
+    # "230 lines to analyze (audit.log 200, auth.log 30)"
+    total = sum(len(lines) for _, lines, _ in reads)
+    parts = ", ".join(f"{source.name} {len(lines)}" for source, lines, _ in reads)
+    return f"{total} lines to analyze ({parts})."
 
 def jsonl_contains_hash(jsonl_path, event_hash):
-    if not os.path.exists(jsonl_path):
-        return False
-    with open(jsonl_path, "r") as f:
-        for line in f:
-            try:
-                if json.loads(line).get("event_hash") == event_hash:
-                    return True
-            except:
+    return event_hash in get_jsonl_index(jsonl_path)
+
+def unseen_events(index, events):
+    # Events whose hash the index holds were stored, or counted into a
+    # coalesced record, by an earlier cycle; so were repeats within `events`.
+    # They are dropped before coalescing, so a cycle read again (an offset
+    # not committed, a restart) does not count them a second time.
+    fresh, seen = [], set()
+    for event in events:
+        event_hash = event["event_hash"]
+        if event_hash in index or event_hash in seen:
+            log.debug(f"Duplicate event skipped: {event.get('event_type')}")
+            continue
+        seen.add(event_hash)
+        fresh.append(event)
+    return fresh
+
+def mark_coalesced(index, events):
+    # The repeats merged into a record are remembered like stored events
+    for event in events:
+        index.add(event["event_hash"])
+
+def append_jsonl_events(jsonl_path, events, settings=None):
+    # `settings`: the `segments` section, so the first append of a run
+    # already uses the configured segment size
+    with metrics.time_stage("jsonl_append"):
+        get_event_log(jsonl_path, settings).append(events)
+    index = get_jsonl_index(jsonl_path)
+    for event in events:
+        index.add(event["event_hash"])
+
+def maintain_event_logs(config):
+    # Segment compaction/retention for the event and archive logs
+    for path in (config["output"]["jsonl"], ARCHIVE_PATH):
+        try:
+            compressed, removed = get_event_log(path, config.get("segments")).maintain()
+        except Exception as e:
+            log.error(f"Segment maintenance failed for {path}: {e}")
+            continue
+        if compressed or removed:
+            log.info(f"Segments of {path}: {compressed} compressed, {removed} removed.")
+
+def get_coalescer(config):
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = StormCoalescer.from_config(db.get_connection(config["output"]["db"]), config)
+    return _coalescer
+
+def store_events(config, detected_events, deleted_hashes):
+    conn = db.get_connection(config["output"]["db"])
+    writer = db.EventWriter(conn)
+    index = get_jsonl_index(config["output"]["jsonl"])
+
+    kept = []
+    with metrics.time_stage("dedup"):
+        for event in detected_events:
+            event_hash = generate_event_hash(event)
+            event["event_hash"] = event_hash
+
+            if event_hash in deleted_hashes:
+                log.debug(f"Skipped deleted event: {event.get('event_type')} ({event_hash})")
+                log.summarize("deleted", "{count} previously deleted event(s) skipped")
+                metrics.DELETED_SKIPPED.inc()
                 continue
-    return False
+
+            kept.append(enrich_event(event))
+        fresh = unseen_events(index, kept)
+    if len(fresh) < len(kept):
+        log.summarize("duplicates", "{count} duplicate event(s) skipped", len(kept) - len(fresh))
+        metrics.DUPLICATES.inc(len(kept) - len(fresh))
+
+    # Repeats of an open record only bump its count
+    records, merges = get_coalescer(config).process(fresh)
+    if len(records) < len(fresh):
+        log.summarize("coalesced", "{count} repeated event(s) coalesced", len(fresh) - len(records))
+        metrics.COALESCED.inc(len(fresh) - len(records))
+
+    for event in records:
+        writer.add(event)
+        log.debug(f"Added event to JSONL: {event.get('event_type')}")
+
+    # One transaction and one segment append for the whole cycle
+    writer.flush()
+    stored = records
+    try:
+        append_jsonl_events(config["output"]["jsonl"], stored, config.get("segments"))
+    except Exception as e:
+        # Not in the event log: not reported as stored or published
+        log.error(f"Failed to write events to JSONL: {e}")
+        stored = []
+    if merges:
+        db.merge_counts(conn, merges)
+    if len(records) < len(fresh):
+        mark_coalesced(index, fresh)
+    metrics.EVENTS_STORED.inc(len(stored))
+    if stored:
+        bus.publish(bus.EVENTS_INSERTED, stored)
+    return stored
+
+def export_metrics(config):
+    # Prometheus text file; a one-shot run reports its own cycle only
+    path = (config.get("metrics") or {}).get("textfile", metrics.TEXTFILE_PATH)
+    if not path:
+        return
+    try:
+        metrics.write_textfile(path)
+    except Exception as e:
+        log.error(f"Failed to write metrics to {path}: {e}")
 
 def main():
+    from core.daemon import daemon_running
+    if daemon_running():
+        log.info("noctilogd is running and following the log files; skipping one-shot analysis.")
+        return
+
     config = load_config()
+    log.configure(config.get("logging"), rotate=True)
     ensure_rules_installed()
     load_auditd_rules()
-    log_debug("Configuration loaded.")
+    log.info("Configuration loaded.")
 
     deleted_hashes = load_deleted_hashes()
-    tail_lines = config.get("log_tail_lines", 200)
-    audit_lines = read_audit_log(tail_lines)
-    log_debug(f"{len(audit_lines)} audit lines to analyze.")
+    reads = read_sources(config)
+    log.info(describe_reads(reads))
 
-    if not audit_lines:
-        log_debug("No new audit lines found.")
+    if not any(lines for _, lines, _ in reads):
+        log.info("No new log lines found.")
+        commit_offsets(reads)
+        export_metrics(config)
         return
 
     try:
         with open("output/logs_snapshot.txt", "w") as f:
-            f.write("".join(audit_lines))
-        log_debug("Audit log snapshot saved.")
+            for _, lines, _ in reads:
+                f.write("".join(lines))
+        log.debug("Log snapshot saved.")
     except Exception as e:
-        log_debug(f"Failed to save snapshot: {e}")
+        log.error(f"Failed to save snapshot: {e}")
 
-    detected_events = run_detectors(config, audit_lines)
-    log_debug(f"{len(detected_events)} event(s) detected.")
+    detected_events = detect_sources(config, reads)
+    log.info(f"{len(detected_events)} event(s) detected.")
 
-    conn = db.init_db(config["output"]["db"])
-    log_debug("Connected to database.")
-
-    for event in detected_events:
-        event_hash = generate_event_hash(event)
-        event["event_hash"] = event_hash
-
-        if event_hash in deleted_hashes:
-            log_debug(f"Skipped deleted event: {event.get('event_type')} ({event_hash})")
-            continue
-
-        db.insert_event(conn, event)
-
-        if not jsonl_contains_hash(config["output"]["jsonl"], event_hash):
-            try:
-                with open(config["output"]["jsonl"], "a") as f:
-                    f.write(json.dumps(event) + "\n")
-                log_debug(f"Added event to JSONL: {event.get('event_type')}")
-            except Exception as e:
-                log_debug(f"Failed to write event to JSONL: {e}")
-        else:
-            log_debug(f"Duplicate event skipped in JSONL: {event.get('event_type')}")
+    store_events(config, detected_events, deleted_hashes)
+    commit_offsets(reads)
+    maintain_event_logs(config)
+    export_metrics(config)
+    log.flush_summaries()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,39 @@
+import sys
+import os
+import argparse
+
+if os.geteuid() != 0:
+    print("❌ This script must be run as root. Use: sudo python3 noctilogd.py")
+    sys.exit(1)
+
+from main import load_config, ensure_rules_installed, load_auditd_rules
+from core import log
+from core.audisp import MODES, STDIN
+from core.daemon import Daemon, daemon_running
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Follow the configured log files continuously.")
+    parser.add_argument("--audisp", choices=MODES, help="audit.log ingestion, overrides audisp.mode in config.yaml")
+    parser.add_argument("--socket", help="af_unix plugin socket, overrides audisp.socket")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.audisp == STDIN:
+        # Started by auditd as a plugin: the working directory is not ours
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if daemon_running():
+        print("❌ noctilogd is already running.")
+        sys.exit(1)
+    config = load_config()
+    audisp = dict(config.get("audisp") or {})
+    if args.audisp:
+        audisp["mode"] = args.audisp
+    if args.socket:
+        audisp["socket"] = args.socket
+    config["audisp"] = audisp
+    log.configure(config.get("logging"), rotate=True)
+    ensure_rules_installed()
+    load_auditd_rules()
+    log.info("Configuration loaded.")
+    Daemon(config).run()
@@ -1,53 +1,158 @@
-
 import os
-import json
-import time
+import wave
 import threading
+import subprocess
+from core import db, bus, log
 
 SOUND_FILES = {
     "low": "sounds/low.wav",
     "medium": "sounds/medium.wav",
     "high": "sounds/high.wav"
 }
+DB_PATH = "output/events.db"
+REPEAT_INTERVAL = 1.0
+
+# aplay sample formats by WAV sample width in bytes
+APLAY_FORMATS = {1: "U8", 2: "S16_LE", 3: "S24_3LE", 4: "S32_LE"}
+
+PRIORITY = {"low": 1, "medium": 2, "high": 3}
+
+class SeverityCounts:
+    """
+    Running count of unacknowledged events per severity, kept current from
+    bus notifications so the highest active severity never needs a scan.
+    """
+
+    def __init__(self, counts=None):
+        self.lock = threading.Lock()
+        self.counts = {severity: 0 for severity in PRIORITY}
+        for severity, count in (counts or {}).items():
+            self.counts[severity if severity in PRIORITY else "low"] += count
+
+    def add(self, severity, count=1):
+        with self.lock:
+            severity = severity if severity in PRIORITY else "low"
+            self.counts[severity] = max(self.counts[severity] + count, 0)
+
+    def highest(self):
+        for severity in ("high", "medium", "low"):
+            if self.counts[severity] > 0:
+                return severity
+        return None
+
+class SoundPlayer:
+    """
+    Decodes each WAV file once and streams its frames into a long-lived
+    `aplay` reading raw PCM from stdin (one per sample format), instead of
+    forking a new player for every alert. Writing blocks while aplay's pipe
+    is full, which paces repeats to the length of the clip.
+    """
+
+    def __init__(self, sound_files=SOUND_FILES):
+        self.sound_files = sound_files
+        self.clips = {}
+        self.players = {}
+        self.available = True
+
+    def load(self, severity):
+        if severity not in self.clips:
+            path = self.sound_files.get(severity)
+            clip = None
+            if path and os.path.exists(path):
+                try:
+                    with wave.open(path, "rb") as f:
+                        params = (f.getsampwidth(), f.getframerate(), f.getnchannels())
+                        clip = (params, f.readframes(f.getnframes()))
+                except (wave.Error, EOFError) as e:
+                    log.error(f"[Sound] Cannot decode {path}: {e}")
+            self.clips[severity] = clip
+        return self.clips[severity]
+
+    def player(self, params):
+        process = self.players.get(params)
+        if process is None or process.poll() is not None:
+            width, rate, channels = params
+            process = subprocess.Popen(
+                ["aplay", "-q", "-t", "raw", "-f", APLAY_FORMATS.get(width, "S16_LE"),
+                 "-r", str(rate), "-c", str(channels)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            self.players[params] = process
+        return process
+
+    def play(self, severity):
+        clip = self.load(severity)
+        if clip is None or not self.available:
+            return
+        params, frames = clip
+        try:
+            process = self.player(params)
+            process.stdin.write(frames)
+            process.stdin.flush()
+        except FileNotFoundError:
+            self.available = False
+            log.warning("[Sound] aplay not found, sound disabled.")
+        except (OSError, ValueError) as e:
+            # aplay missing or exited; a new one is started on the next call
+            self.players.pop(params, None)
+            log.error(f"[Sound] {e}")
+
+    def close(self):
+        for process in self.players.values():
+            try:
+                process.stdin.close()
+                process.wait(timeout=1)
+            except Exception:
+                process.kill()
+        self.players.clear()
 
 sound_enabled = False
 sound_thread = None
+severity_counts = None
+player = SoundPlayer()
 stop_event = threading.Event()
+wake_event = threading.Event()
 thread_lock = threading.Lock()
 
-def get_highest_severity(events):
-    priority = {"low": 1, "medium": 2, "high": 3}
-    highest = None
-    for e in events:
-        if not e.get("acknowledged", False):
-            sev = e.get("severity", "low")
-            if not highest or priority[sev] > priority[highest]:
-                highest = sev
-    return highest
-
-def load_events():
+def load_counts(db_path=DB_PATH):
+    # Seeded once from SQLite; from then on the bus keeps the counts current
     try:
-        with open("output/events.jsonl", "r") as f:
-            return [json.loads(line) for line in f if line.strip()]
+        return db.unacknowledged_counts(db.get_connection(db_path))
     except Exception:
-        return []
+        return {}
+
+def on_events_inserted(events):
+    for event in events:
+        if not event.get("acknowledged", False):
+            severity_counts.add(event.get("severity", "low"))
+    wake_event.set()
+
+def on_event_acknowledged(event):
+    severity_counts.add(event.get("severity", "low"), -1 if event.get("acknowledged") else 1)
+    wake_event.set()
 
 def sound_loop():
     while not stop_event.is_set():
-        if sound_enabled:
-            events = load_events()
-            highest = get_highest_severity(events)
-            if highest:
-                path = SOUND_FILES.get(highest)
-                if path and os.path.exists(path):
-                    os.system(f"aplay -q {path} &")
-        time.sleep(1.0)
-    print("[Sound Loop] Stopped.")
-
-def start_sound_loop():
-    global sound_thread
+        highest = severity_counts.highest() if sound_enabled else None
+        if highest:
+            player.play(highest)
+            stop_event.wait(REPEAT_INTERVAL)
+        else:
+            # Idle until an insert, acknowledge or enable wakes us up
+            wake_event.wait()
+            wake_event.clear()
+    player.close()
+    log.info("[Sound Loop] Stopped.")
+
+def start_sound_loop(db_path=DB_PATH):
+    global sound_thread, severity_counts
     with thread_lock:
         if sound_thread is None or not sound_thread.is_alive():
+            severity_counts = SeverityCounts(load_counts(db_path))
+            bus.subscribe(bus.EVENTS_INSERTED, on_events_inserted)
+            bus.subscribe(bus.EVENT_ACKNOWLEDGED, on_event_acknowledged)
             stop_event.clear()
             sound_thread = threading.Thread(target=sound_loop, daemon=True)
             sound_thread.start()
@@ -55,8 +160,12 @@ def start_sound_loop():
 def set_sound_enabled(state: bool):
     global sound_enabled
     sound_enabled = state
+    wake_event.set()
     if not state:
-        print("[Sound Loop] Disabled.")
+        log.info("[Sound Loop] Disabled.")
 
 def stop_sound_loop():
+    bus.unsubscribe(bus.EVENTS_INSERTED, on_events_inserted)
+    bus.unsubscribe(bus.EVENT_ACKNOWLEDGED, on_event_acknowledged)
     stop_event.set()
+    wake_event.set()
@@ -0,0 +1,101 @@
+import os
+import gzip
+
+import pytest
+
+from core.tailer import LogTailer
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / "audit.log"
+    path.write_text("")
+    return str(path)
+
+@pytest.fixture
+def tailer(log_path, tmp_path):
+    tailer = LogTailer(log_path, str(tmp_path / "offset.txt"), tail_lines=0)
+    assert read(tailer) == []
+    return tailer
+
+def read(tailer):
+    return [line.rstrip("\n") for line in tailer.read_new_lines()]
+
+def append(path, *lines):
+    with open(path, "a") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+def test_reads_only_new_complete_lines(log_path, tailer):
+    append(log_path, "one", "two")
+    with open(log_path, "a") as f:
+        f.write("partial")
+    assert read(tailer) == ["one", "two"]
+    assert read(tailer) == []
+    append(log_path, " line")
+    assert read(tailer) == ["partial line"]
+
+def test_rotation_drains_the_rotated_file_first(log_path, tailer):
+    append(log_path, "one")
+    assert read(tailer) == ["one"]
+    append(log_path, "two")
+    os.rename(log_path, log_path + ".1")
+    append(log_path, "three")
+    assert read(tailer) == ["two", "three"]
+
+def test_rotation_reads_a_compressed_rotated_file(log_path, tailer):
+    append(log_path, "one")
+    assert read(tailer) == ["one"]
+    append(log_path, "two")
+    # Renamed away first so the new file cannot reuse the inode
+    moved = log_path + ".moved"
+    os.rename(log_path, moved)
+    append(log_path, "three")
+    with open(moved, "rb") as src, gzip.open(log_path + ".1.gz", "wb") as dst:
+        dst.write(src.read())
+    os.remove(moved)
+    assert read(tailer) == ["two", "three"]
+
+def test_rotation_without_the_rotated_file_warns(log_path, tailer, monkeypatch):
+    warnings = []
+    monkeypatch.setattr("core.tailer.log.warning", warnings.append)
+    append(log_path, "one")
+    assert read(tailer) == ["one"]
+    append(log_path, "lost")
+    moved = log_path + ".moved"
+    os.rename(log_path, moved)
+    append(log_path, "three")
+    os.remove(moved)
+    assert read(tailer) == ["three"]
+    assert len(warnings) == 1 and "not found" in warnings[0]
+
+def test_truncation_restarts_at_the_beginning(log_path, tailer):
+    append(log_path, "a fairly long first line", "and a second one")
+    assert len(read(tailer)) == 2
+    with open(log_path, "w") as f:
+        f.write("short\n")
+    assert read(tailer) == ["short"]
+
+def test_rewrite_past_the_offset_restarts_at_the_beginning(log_path, tailer):
+    append(log_path, "first", "second")
+    assert read(tailer) == ["first", "second"]
+    # Same inode, written again beyond the old offset between two reads
+    with open(log_path, "w") as f:
+        f.write("rewritten\nlonger than before\n")
+    assert read(tailer) == ["rewritten", "longer than before"]
+
+def test_rewind_reads_the_lines_again(log_path, tailer):
+    append(log_path, "one")
+    assert read(tailer) == ["one"]
+    inode, offset = tailer.position()
+    append(log_path, "two", "three")
+    assert read(tailer) == ["two", "three"]
+    tailer.rewind(offset)
+    assert read(tailer) == ["two", "three"]
+
+def test_commit_persists_the_position(log_path, tailer, tmp_path):
+    append(log_path, "one")
+    read(tailer)
+    tailer.commit()
+    append(log_path, "two")
+    again = LogTailer(log_path, str(tmp_path / "offset.txt"), tail_lines=0)
+    assert read(again) == ["two"]